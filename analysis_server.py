@@ -0,0 +1,233 @@
+"""
+Ball Sort Puzzle Solver - Local HTTP analysis service
+
+POST /analyze  {"image": "<base64 PNG/JPEG>", "layout": {...}}
+GET  /metrics  queue depth, counters and latency percentiles
+GET  /health
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Add paths
+sys.path.append(os.path.join(os.path.dirname(__file__), 'models'))
+
+import analysis_pipeline
+from image_processor import DECODER_BACKENDS
+
+HTTP_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+def warm_worker():
+    """Worker initializer: import the pipeline once per process"""
+    import analysis_pipeline  # noqa: F401
+
+def ping_worker():
+    """No-op task used to start every worker before the first request"""
+    return os.getpid()
+
+def run_analysis(image_bytes, layout, decoder_backend):
+    """Worker task running the analysis pipeline"""
+    return analysis_pipeline.analyze_image_bytes(image_bytes, layout, decoder_backend)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class AnalysisServer:
+    def __init__(self, host='127.0.0.1', port=8765, workers=None, max_queue=64,
+                 max_body_bytes=32 * 1024 * 1024, latency_window=1000, decoder_backend='pil-draft'):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_body_bytes = max_body_bytes
+        self.decoder_backend = decoder_backend
+
+        self.executor = None
+        self.pending = 0
+        self.completed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.latencies_ms = deque(maxlen=latency_window)
+        self.started_at = None
+
+    async def start_workers(self):
+        """Pre-fork the process pool so requests never pay startup cost"""
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, ping_worker) for _ in range(self.workers)
+        ])
+        return sorted(set(pids))
+
+    async def serve(self):
+        """Start workers and serve HTTP requests forever"""
+        pids = await self.start_workers()
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.started_at = time.time()
+        print(f"Service d'analyse sur http://{self.host}:{self.port} "
+              f"({self.workers} workers, {len(pids)} processus préchauffés)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown()
+
+    async def handle_connection(self, reader, writer):
+        """Handle one HTTP/1.1 connection (keep-alive supported)"""
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            await self.write_response(writer, 400, {'error': str(e)}, False)
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """Read request line, headers and body (None on closed connection)"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) < 2:
+            raise ValueError("Requête invalide")
+        method, path = parts[0].upper(), parts[1].split('?', 1)[0]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0) or 0)
+        if length > self.max_body_bytes:
+            raise ValueError("Corps de requête trop volumineux")
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def write_response(self, writer, status, payload, keep_alive=True):
+        """Write a JSON response"""
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        """Route a request to its handler"""
+        if path == '/analyze':
+            if method != 'POST':
+                return 405, {'error': "POST requis"}
+            return await self.handle_analyze(body)
+        if path == '/metrics':
+            return 200, self.get_metrics()
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        return 404, {'error': f"Chemin inconnu: {path}"}
+
+    async def handle_analyze(self, body):
+        """Run one analysis request on the worker pool"""
+        try:
+            request = json.loads(body or b'{}')
+            image_bytes = base64.b64decode(request['image'])
+            layout = request['layout']
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': f"Requête invalide: {e}"}
+
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            return 503, {'error': "File d'attente pleine"}
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.pending += 1
+        try:
+            result = await loop.run_in_executor(self.executor, run_analysis, image_bytes, layout,
+                                                self.decoder_backend)
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            # OSError covers undecodable images (PIL UnidentifiedImageError)
+            self.errors += 1
+            return 400, {'error': str(e)}
+        except Exception as e:
+            self.errors += 1
+            return 500, {'error': str(e)}
+        finally:
+            self.pending -= 1
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latencies_ms.append(latency_ms)
+        self.completed += 1
+        result['latency_ms'] = round(latency_ms, 2)
+        return 200, result
+
+    def get_metrics(self):
+        """Queue depth, counters and latency percentiles over the recent window"""
+        latencies = sorted(self.latencies_ms)
+        return {
+            'workers': self.workers,
+            'in_flight': min(self.pending, self.workers),
+            'queue_depth': max(0, self.pending - self.workers),
+            'completed': self.completed,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'uptime_s': round(time.time() - self.started_at, 1) if self.started_at else 0,
+            'latency_ms': {
+                'count': len(latencies),
+                'p50': percentile(latencies, 0.50),
+                'p90': percentile(latencies, 0.90),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None
+            }
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP local d'analyse d'images")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--decoder', choices=DECODER_BACKENDS, default='pil-draft',
+                        help="Décodeur des images (pil, pil-draft ou cv2)")
+    args = parser.parse_args(argv)
+
+    server = AnalysisServer(args.host, args.port, args.workers, args.max_queue,
+                            decoder_backend=args.decoder)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
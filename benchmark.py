@@ -0,0 +1,165 @@
+"""
+Ball Sort Puzzle Solver - Solver benchmark runner
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Add paths
+sys.path.append(os.path.join(os.path.dirname(__file__), 'models'))
+
+from level_generator import LevelGenerator
+from puzzle_solver import PuzzleSolver
+from matrix_export import build_board, JsonLinesWriter
+
+BENCHMARK_FIELDS = [
+    'level_id', 'num_colors', 'num_tubes', 'balls_per_tube', 'solved',
+    'solve_time_s', 'expanded_nodes', 'nodes_per_second', 'peak_memory_kb',
+    'solution_length'
+]
+
+def normalize_solver_result(result):
+    """Normalize solver output to (solved, moves, expanded_nodes)
+
+    Solvers may return a dict with 'moves'/'expanded_nodes'/'solved', a plain
+    list of moves, or None when no solution was found.
+    """
+    if result is None:
+        return False, [], None
+    if isinstance(result, dict):
+        moves = result.get('moves') or []
+        solved = result.get('solved', bool(moves))
+        return solved, moves, result.get('expanded_nodes')
+    moves = list(result)
+    return True, moves, None
+
+def run_benchmark(solver, levels, progress_callback=None, measure_memory=True):
+    """Run a solver callable on every level and collect metrics
+
+    The solver is called as solver(color_matrix). Peak memory is the peak
+    of Python allocations during each solve, above what was allocated
+    before it (tracemalloc peak reset for every level). A tracing session
+    started by the caller is left running. Tracing slows solving, so
+    measure_memory=False gives cleaner timings.
+    """
+    records = []
+    for level in levels:
+        matrix = level['color_matrix']
+
+        peak_memory_kb = None
+        started_tracing = False
+        if measure_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            result = solver(matrix)
+            elapsed = time.perf_counter() - start
+        finally:
+            if measure_memory:
+                peak_memory_kb = max(0, tracemalloc.get_traced_memory()[1] - baseline) // 1024
+            if started_tracing:
+                tracemalloc.stop()
+
+        solved, moves, expanded = normalize_solver_result(result)
+        nodes_per_second = None
+        if expanded is not None and elapsed > 0:
+            nodes_per_second = round(expanded / elapsed, 1)
+
+        record = {
+            'level_id': level.get('level_id', str(len(records))),
+            'num_colors': level.get('num_colors'),
+            'num_tubes': len(matrix),
+            'balls_per_tube': max((len(tube) for tube in matrix), default=0),
+            'solved': solved,
+            'solve_time_s': round(elapsed, 6),
+            'expanded_nodes': expanded,
+            'nodes_per_second': nodes_per_second,
+            'peak_memory_kb': peak_memory_kb,
+            'solution_length': len(moves) if solved else None
+        }
+        records.append(record)
+
+        if progress_callback:
+            progress_callback(record)
+
+    return records
+
+def write_csv(records, path):
+    """Write benchmark records to CSV"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=BENCHMARK_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+
+def write_json(records, path, metadata=None):
+    """Write benchmark records (and run metadata) to JSON"""
+    with open(path, 'w') as f:
+        json.dump({'metadata': metadata or {}, 'results': records}, f, indent=2)
+
+def summarize(records):
+    """Summarize benchmark records by color count"""
+    by_colors = {}
+    for record in records:
+        by_colors.setdefault(record['num_colors'], []).append(record)
+
+    lines = []
+    for num_colors in sorted(by_colors):
+        group = by_colors[num_colors]
+        solved = [r for r in group if r['solved']]
+        avg_time = sum(r['solve_time_s'] for r in group) / len(group)
+        avg_len = (sum(r['solution_length'] for r in solved) / len(solved)) if solved else 0
+        lines.append(f"{num_colors:2d} couleurs: {len(solved)}/{len(group)} résolus, "
+                     f"{avg_time * 1000:.1f} ms/niveau, {avg_len:.1f} coups")
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du solveur sur des niveaux aléatoires")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-colors', type=int, default=2)
+    parser.add_argument('--max-colors', type=int, default=20)
+    parser.add_argument('--levels-per-size', type=int, default=5)
+    parser.add_argument('--balls-per-tube', type=int, default=4)
+    parser.add_argument('--empty-tubes', type=int, default=2)
+    parser.add_argument('--max-nodes', type=int, default=200000)
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Ne pas mesurer la mémoire (temps plus précis)")
+    parser.add_argument('--csv', help="Fichier CSV de sortie")
+    parser.add_argument('--json', help="Fichier JSON de sortie")
+    parser.add_argument('--export-levels', metavar='FICHIER.jsonl',
+                        help="Exporter les niveaux générés (un plateau JSON par ligne)")
+    args = parser.parse_args(argv)
+
+    generator = LevelGenerator(seed=args.seed)
+    levels = generator.difficulty_sweep(args.max_colors, args.min_colors, args.levels_per_size,
+                                        args.balls_per_tube, args.empty_tubes)
+
+    if args.export_levels:
+        with JsonLinesWriter(args.export_levels) as writer:
+            for level in levels:
+                board = build_board([level['color_matrix']], [level['balls_per_tube']])
+                writer.write(board, level_id=level['level_id'])
+        print(f"{writer.count} niveaux exportés: {args.export_levels}")
+
+    solver = PuzzleSolver(max_nodes=args.max_nodes)
+    records = run_benchmark(solver.solve, levels, measure_memory=not args.no_memory)
+
+    for line in summarize(records):
+        print(line)
+
+    if args.csv:
+        write_csv(records, args.csv)
+    if args.json:
+        write_json(records, args.json, metadata=vars(args))
+
+if __name__ == "__main__":
+    main()
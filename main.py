@@ -6,6 +6,11 @@ from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import sys
 import os
+import argparse
+import cProfile
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure CustomTkinter
 ctk.set_appearance_mode("dark")  # Modes: "System", "Dark", "Light"
@@ -16,16 +21,29 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'models'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'ui'))
 
 # Import modules
-from image_processor import ImageProcessor
-from grid_generator import GridGenerator  
+from image_processor import ImageProcessor, DECODER_BACKENDS
+from grid_generator import GridGenerator, build_grid_matrix
 from color_analyzer import ColorAnalyzer
 from multi_row_manager import MultiRowManager
+from calibration_profiles import CalibrationProfiles
+from board_detector import BoardDetector
+from session_store import save_session, load_session
+from analysis_pipeline import analyze_rows, store_row_analyses
+from aggregated_results import row_label
+from matrix_export import board_from_manager, write_board
 from parameter_panel import ParameterPanel
 from crop_tool import CropTool
 from corner_selector import CornerSelector
+from results_view import VirtualResultsList, TubeMatrixThumbnail
+from instrumentation import instrumentation
 
 class BallSortSolver:
-    def __init__(self):
+    # Max image side used for analysis in fast mode
+    FAST_MODE_MAX_SIZE = 1600
+    # Raw frame files (metadata in a <frame>.json sidecar)
+    RAW_FRAME_EXTENSIONS = ('.raw', '.rgb', '.npy')
+    
+    def __init__(self, decoder_backend='pil-draft'):
         self.root = ctk.CTk()
         self.root.title("Ball Sort Puzzle Solver - Modern Edition")
         self.root.geometry("1400x900")
@@ -33,14 +51,25 @@ class BallSortSolver:
         
         # Core components
         self.image_processor = ImageProcessor()
+        self.image_processor.set_decoder_backend(decoder_backend)
         self.grid_generator = GridGenerator()
         self.color_analyzer = ColorAnalyzer()
         self.multi_row_manager = MultiRowManager()
+        self.calibration_profiles = CalibrationProfiles()
+        self.board_detector = BoardDetector()
         
         # State
         self.current_grid = []
         self.photo = None
         self.is_multi_row_mode = False
+        self.regroup_job = None
+        
+        # All rows analysis runs off the Tk thread; worker spans are queued for it
+        self.batch_executor = ThreadPoolExecutor(max_workers=1)
+        self.batch_future = None
+        self.pending_spans = queue.Queue()
+        # Per-frame spans (live previews) are kept in the stats but not shown
+        self.quiet_spans = {'CornerSelector.redraw_grid'}
         
         self.setup_ui()
     
@@ -70,6 +99,16 @@ class BallSortSolver:
         
         # Set callback for tube parameter changes
         self.parameter_panel.set_tube_params_change_callback(self.on_tube_params_changed)
+        self.parameter_panel.set_save_profile_callback(self.save_calibration_profile)
+        self.parameter_panel.set_session_callbacks(self.save_session, self.load_session)
+        self.parameter_panel.set_tolerance_change_callback(self.on_tolerance_changed)
+        self.parameter_panel.set_auto_tolerance_callback(self.auto_tune_tolerance)
+        self.parameter_panel.set_analyze_all_rows_callback(self.analyze_all_rows)
+        self.parameter_panel.set_auto_crop_callback(self.auto_crop)
+        
+        # Show top-level stage timings in the status panel
+        self.parameter_panel.set_export_timings_callback(self.export_timings)
+        instrumentation.add_listener(self.on_span_recorded)
         
         # Tools
         self.crop_tool = CropTool(self.root, self.on_crop_complete)
@@ -114,17 +153,30 @@ class BallSortSolver:
         """Upload image"""
         file_path = filedialog.askopenfilename(
             title="Sélectionner image",
-            filetypes=[("Images", "*.png *.jpg *.jpeg *.bmp")]
+            filetypes=[("Images", "*.png *.jpg *.jpeg *.bmp"),
+                       ("Images brutes", "*.raw *.rgb *.npy")]
         )
         
         if file_path:
             try:
-                self.image_processor.load_image(file_path)
+                if file_path.lower().endswith(self.RAW_FRAME_EXTENSIONS):
+                    # Raw frames are memory-mapped, no decode needed
+                    self.image_processor.load_frame_file(file_path)
+                else:
+                    # Fast mode decodes large captures at reduced size
+                    max_size = self.FAST_MODE_MAX_SIZE if self.parameter_panel.get_fast_mode() else None
+                    self.image_processor.set_max_analysis_size(max_size)
+                    self.image_processor.load_image(file_path)
                 self.display_current_image()
                 self.parameter_panel.enable_crop_button(True)
                 self.parameter_panel.enable_start_button(True)
-                self.parameter_panel.add_status_message("Image chargée")
+                if self.image_processor.is_downsampled():
+                    width, height = self.image_processor.original_image.size
+                    self.parameter_panel.add_status_message(f"Image chargée (réduite: {width}x{height})")
+                else:
+                    self.parameter_panel.add_status_message("Image chargée")
                 self.clear_results()
+                self.apply_matching_profile()
             except Exception as e:
                 messagebox.showerror("Erreur", f"Erreur: {str(e)}")
     
@@ -159,26 +211,73 @@ class BallSortSolver:
         """Crop complete"""
         try:
             cropped = self.image_processor.crop_image(x1, y1, x2, y2)
-            if cropped:
-                # Save images to multi-row manager if in multi-row mode
+            if cropped is not None:
+                # Rows only keep their crop box, pixels stay in the single source
                 if self.is_multi_row_mode:
-                    self.multi_row_manager.set_current_row_images(
-                        cropped.copy(),
-                        self.image_processor.processed_image.copy() if self.image_processor.processed_image else None
-                    )
+                    self.multi_row_manager.set_current_row_crop_box(self.image_processor.crop_box)
                 
                 self.display_current_image()
                 self.parameter_panel.enable_corners_button(True)
-                self.parameter_panel.add_status_message(f"Recadré: {cropped.size}")
+                self.parameter_panel.add_status_message(f"Recadré: {(cropped.shape[1], cropped.shape[0])}")
         except Exception as e:
             messagebox.showerror("Erreur", str(e))
     
+    def auto_crop(self):
+        """Detect the tube rows and use their boxes as row crops
+
+        Rows cropped by hand keep their box. Rows whose box changes lose
+        their corners, grid and analysis, which pointed at other pixels.
+        """
+        if self.image_processor.source_array is None:
+            messagebox.showerror("Erreur", "Charger une image d'abord")
+            return
+        
+        # In multi-row mode the configured row count is kept
+        num_rows = self.multi_row_manager.num_rows if self.is_multi_row_mode else None
+        boxes = self.board_detector.detect_rows(self.image_processor.source_array, num_rows)
+        if not boxes:
+            messagebox.showerror("Erreur", "Aucune rangée d'éprouvettes détectée")
+            return
+        
+        if not self.is_multi_row_mode or self.multi_row_manager.num_rows != len(boxes):
+            self.parameter_panel.set_num_rows(len(boxes))
+            self.start_multi_row_configuration()
+        
+        current_row = self.multi_row_manager.current_row
+        updated = 0
+        kept = 0
+        for row_idx, box in enumerate(boxes):
+            row_data = self.multi_row_manager.rows_data[row_idx]
+            if row_data['crop_box'] is not None and not row_data['auto_crop']:
+                kept += 1
+                continue
+            if row_data['crop_box'] is not None and tuple(row_data['crop_box']) == tuple(box):
+                continue
+            self.multi_row_manager.current_row = row_idx
+            self.multi_row_manager.set_current_row_crop_box(box, auto=True)
+            self.multi_row_manager.clear_current_row_calibration()
+            updated += 1
+        self.multi_row_manager.current_row = current_row
+        
+        self.load_current_row_data()
+        self.update_multi_row_ui()
+        message = f"Recadrage auto: {updated} rangée(s) recadrée(s)"
+        if kept:
+            message += f", {kept} recadrage(s) manuel(s) conservé(s)"
+        self.parameter_panel.add_status_message(message)
+    
     def open_corner_selector(self):
         """Open corner selector"""
         if not self.image_processor.processed_image:
             messagebox.showerror("Erreur", "Recadrer d'abord")
             return
-        self.corner_selector.open_corner_dialog(self.image_processor.processed_image)
+        num_tubes, balls_per_tube = self.parameter_panel.get_tube_parameters()
+        # Reopening the selector resumes from the current corners
+        corners = self.grid_generator.get_corner_points() if self.grid_generator.is_ready() else None
+        self.corner_selector.open_corner_dialog(
+            self.image_processor.processed_image, num_tubes, balls_per_tube,
+            corners, self.grid_generator.ball_radius if corners else None
+        )
     
     def on_corners_complete(self, corner_points, radius):
         """Corners complete"""
@@ -204,6 +303,7 @@ class BallSortSolver:
             
             # Generate grid
             self.current_grid = self.grid_generator.generate_grid()
+            self.color_analyzer.clear_dendrogram()
             
             if self.current_grid:
                 expected_total = self.grid_generator.get_expected_ball_count()
@@ -245,27 +345,87 @@ class BallSortSolver:
             tolerance = self.parameter_panel.get_color_tolerance()
             self.color_analyzer.set_tolerance(tolerance)
             
+            # Ambiguous balls are re-sampled at full resolution in fast mode
+            if self.image_processor.is_downsampled():
+                self.color_analyzer.set_refinement_source(self.load_full_resolution_grid)
+            else:
+                self.color_analyzer.set_refinement_source(None)
+            
             detected = self.color_analyzer.analyze_grid_circles(
-                self.image_processor.processed_image, self.current_grid
+                self.image_processor.get_analysis_image(), self.current_grid
             )
             
             color_groups = self.color_analyzer.group_balls_by_color(detected)
-            self.display_analysis_results(color_groups)
+            slot_matrix = self.show_color_groups(color_groups)
             self.parameter_panel.add_status_message(f"Analysé: {len(detected)} balles")
-            
-            # Save colors to multi-row manager if in multi-row mode
-            if self.is_multi_row_mode:
-                self.multi_row_manager.set_current_row_colors(color_groups)
-                # Create and save matrices
-                grid_matrix = self.create_grid_matrix()
-                color_matrix = self.create_color_matrix(color_groups)
-                self.multi_row_manager.set_current_row_matrices(grid_matrix, color_matrix)
-                # Update UI to show "Terminer" button if on last row
-                self.update_multi_row_ui()
+            uncertain = self.color_analyzer.count_uncertain_slots(slot_matrix)
+            if uncertain:
+                self.parameter_panel.add_status_message(f"⚠️ {uncertain} emplacement(s) incertain(s)")
             
         except Exception as e:
             messagebox.showerror("Erreur", str(e))
     
+    def show_color_groups(self, color_groups):
+        """Display color groups, store them for the current row and return the slot matrix"""
+        self.display_analysis_results(color_groups)
+        num_tubes, balls_per_tube = self.parameter_panel.get_tube_parameters()
+        slot_matrix = self.color_analyzer.build_slot_matrix(num_tubes, balls_per_tube, color_groups)
+        
+        # Save colors to multi-row manager if in multi-row mode
+        if self.is_multi_row_mode:
+            self.multi_row_manager.set_current_row_colors(color_groups)
+            # Create and save matrices
+            grid_matrix = self.create_grid_matrix()
+            color_matrix = self.color_analyzer.build_color_matrix(num_tubes, balls_per_tube, color_groups)
+            self.multi_row_manager.set_current_row_matrices(grid_matrix, color_matrix, slot_matrix)
+            # Update UI to show "Terminer" button if on last row
+            self.update_multi_row_ui()
+        
+        return slot_matrix
+    
+    def on_tolerance_changed(self, tolerance):
+        """Regroup analyzed balls live while the tolerance slider moves"""
+        if self.color_analyzer.dendrogram_balls is None:
+            return
+        # Coalesce slider events into one regroup per idle cycle
+        if self.regroup_job is not None:
+            self.root.after_cancel(self.regroup_job)
+        self.regroup_job = self.root.after_idle(self.regroup_colors)
+    
+    def auto_tune_tolerance(self):
+        """Pick the tolerance giving one full tube per color"""
+        if self.color_analyzer.dendrogram_balls is None:
+            messagebox.showerror("Erreur", "Analyser les couleurs d'abord")
+            return
+        
+        # A queued slider regroup would overwrite the tuned groups
+        if self.regroup_job is not None:
+            self.root.after_cancel(self.regroup_job)
+            self.regroup_job = None
+        
+        _, balls_per_tube = self.parameter_panel.get_tube_parameters()
+        min_tolerance, max_tolerance, step = self.parameter_panel.get_tolerance_range()
+        tolerance, color_groups, exact = self.color_analyzer.auto_tune_tolerance(
+            balls_per_tube, min_tolerance=min_tolerance, max_tolerance=max_tolerance, step=step)
+        self.parameter_panel.set_color_tolerance(tolerance)
+        self.show_color_groups(color_groups)
+        
+        if exact:
+            self.parameter_panel.add_status_message(f"Tolérance auto: {tolerance} ✓ ({len(color_groups)} couleurs)")
+        else:
+            self.parameter_panel.add_status_message(f"Tolérance auto: {tolerance} (groupes incomplets) ⚠️")
+    
+    def regroup_colors(self):
+        """Regroup cached ball colors at the slider tolerance (no pixel sampling)"""
+        self.regroup_job = None
+        color_groups = self.color_analyzer.regroup_balls(self.parameter_panel.get_color_tolerance())
+        self.show_color_groups(color_groups)
+    
+    def load_full_resolution_grid(self):
+        """Get full resolution crop and the current grid scaled to it"""
+        full_image, scale = self.image_processor.get_full_resolution_crop()
+        return full_image, self.grid_generator.scale_circles(self.current_grid, scale)
+    
     def display_analysis_results(self, color_groups):
         """Display results"""
         for widget in self.results_frame.winfo_children():
@@ -284,18 +444,19 @@ class BallSortSolver:
         current_row += 1
         
         total = 0
+        items = []
         for i, (color, balls) in enumerate(color_groups.items()):
             count = len(balls)
             total += count
-            
-            # Simple modern color display for now
             color_name = self.multi_row_manager.get_color_name(color) if self.multi_row_manager else f"Couleur {i+1}"
-            color_text = f"🔴 {color_name}: {count} balles"
-            
-            color_label = ctk.CTkLabel(self.results_frame, text=color_text, 
-                                     font=ctk.CTkFont(size=12))
-            color_label.grid(row=current_row, column=0, sticky="w", padx=10, pady=2)
-            current_row += 1
+            items.append({'text': f"{color_name}: {count} balles", 'color': color})
+        
+        # One canvas for all colors, only visible lines are drawn
+        results_list = VirtualResultsList(self.results_frame, row_height=26,
+                                          height=min(len(items), 6) * 26)
+        results_list.grid(row=current_row, column=0, sticky="ew", padx=10, pady=2)
+        results_list.set_items(items)
+        current_row += 1
         
         # Total and comparison with expected
         expected_total = self.grid_generator.get_expected_ball_count()
@@ -342,6 +503,7 @@ class BallSortSolver:
     
     def clear_results(self):
         """Clear results"""
+        self.color_analyzer.clear_dendrogram()
         for widget in self.results_frame.winfo_children():
             widget.destroy()
     
@@ -394,6 +556,51 @@ class BallSortSolver:
             current_row = self.multi_row_manager.get_current_row_number()
             self.parameter_panel.add_status_message(f"Retour à la rangée {current_row}")
     
+    def analyze_all_rows(self):
+        """Generate grids and analyze colors of every calibrated row concurrently"""
+        if not self.is_multi_row_mode or self.batch_future is not None:
+            return
+        
+        self.save_current_row_data()
+        layout = self.multi_row_manager.get_rows_layout()
+        if not layout:
+            messagebox.showerror("Erreur", "Recadrer et placer les 4 coins de chaque rangée d'abord")
+            return
+        
+        tolerance = self.parameter_panel.get_color_tolerance()
+        self.parameter_panel.enable_analyze_all_button(False)
+        self.parameter_panel.add_status_message(f"Analyse de {len(layout)} rangées...")
+        self.batch_future = self.batch_executor.submit(
+            analyze_rows, self.image_processor, layout, tolerance
+        )
+        self.root.after(50, self.poll_all_rows_analysis)
+    
+    def poll_all_rows_analysis(self):
+        """Collect the all rows analysis on the Tk thread once it is done"""
+        self.flush_pending_spans()
+        if not self.batch_future.done():
+            self.root.after(50, self.poll_all_rows_analysis)
+            return
+        
+        future = self.batch_future
+        self.batch_future = None
+        self.parameter_panel.enable_analyze_all_button(True)
+        try:
+            analyses = future.result()
+        except Exception as e:
+            messagebox.showerror("Erreur", str(e))
+            return
+        
+        store_row_analyses(self.multi_row_manager, analyses)
+        self.load_current_row_data()
+        self.update_multi_row_ui()
+        
+        total_balls = sum(analysis.result['total_balls'] for analysis in analyses)
+        self.parameter_panel.add_status_message(f"Toutes les rangées analysées: {total_balls} balles")
+        uncertain = sum(analysis.result['uncertain_slots'] for analysis in analyses)
+        if uncertain:
+            self.parameter_panel.add_status_message(f"⚠️ {uncertain} emplacement(s) incertain(s)")
+    
     def finish_all_rows(self):
         """Finish all rows and show aggregated results"""
         if not self.is_multi_row_mode:
@@ -415,6 +622,7 @@ class BallSortSolver:
         corners = self.grid_generator.get_corner_points()
         if len(corners) == 4:
             self.multi_row_manager.set_current_row_corners(corners)
+            self.multi_row_manager.set_current_row_radius(self.grid_generator.ball_radius)
         
         # Get the actual current values from the UI spinboxes
         num_tubes = self.parameter_panel.tubes_var.get()
@@ -436,16 +644,18 @@ class BallSortSolver:
         # Reset UI state for new row
         self.current_grid = []
         self.grid_generator.clear_corner_points()
+        self.color_analyzer.clear_dendrogram()
         
-        # Load saved images if available
-        if row_data['cropped_image']:
-            self.image_processor.processed_image = row_data['cropped_image']
+        # Re-slice the source image for this row if it was cropped
+        if row_data['crop_box']:
+            self.image_processor.crop_image(*row_data['crop_box'])
             self.display_current_image()
             self.parameter_panel.enable_corners_button(True)
         
         # Load saved corners if available
         if len(row_data['corners']) == 4:
             self.grid_generator.set_corner_points(row_data['corners'])
+            self.grid_generator.set_ball_radius(row_data['radius'])
             self.parameter_panel.update_corners_status(4)
             self.parameter_panel.enable_generate_button(True)
         else:
@@ -469,6 +679,160 @@ class BallSortSolver:
         else:
             self.clear_results()
     
+    def apply_matching_profile(self):
+        """Apply the saved calibration profile matching the loaded image resolution"""
+        width, height = self.image_processor.get_source_size()
+        rows, key = self.calibration_profiles.find_profile(width, height)
+        if not rows:
+            return False
+        
+        # Profiles are stored at full resolution, the working image may be reduced
+        layout = self.calibration_profiles.scale_rows(rows, self.image_processor.load_scale)
+        self.parameter_panel.set_num_rows(len(layout))
+        if len(layout) == 1 and not self.is_multi_row_mode:
+            self.apply_single_row_layout(layout[0])
+            self.parameter_panel.add_status_message(f"Profil de calibration appliqué: {key}")
+            return True
+        
+        self.start_multi_row_configuration()
+        self.multi_row_manager.load_rows_layout(layout)
+        
+        # Generate every row grid so rows can be analyzed right away
+        for row_idx, row in enumerate(layout):
+            self.grid_generator.set_corner_points(row['corners'])
+            self.grid_generator.set_ball_radius(row['radius'])
+            self.grid_generator.set_tube_parameters(row['num_tubes'], row['balls_per_tube'])
+            self.multi_row_manager.current_row = row_idx
+            self.multi_row_manager.set_current_row_grid(self.grid_generator.generate_grid())
+        self.multi_row_manager.current_row = 0
+        
+        self.update_multi_row_ui()
+        self.load_current_row_data()
+        self.parameter_panel.add_status_message(f"Profil de calibration appliqué: {key}")
+        return True
+    
+    def apply_single_row_layout(self, row):
+        """Apply one calibrated row without entering multi-row mode"""
+        if row['crop_box']:
+            self.image_processor.crop_image(*row['crop_box'])
+            self.display_current_image()
+            self.parameter_panel.enable_corners_button(True)
+        
+        self.parameter_panel.tubes_var.set(row['num_tubes'])
+        self.parameter_panel.balls_var.set(row['balls_per_tube'])
+        self.parameter_panel.update_expected_total()
+        
+        self.grid_generator.set_corner_points(row['corners'])
+        self.grid_generator.set_ball_radius(row['radius'])
+        self.grid_generator.set_tube_parameters(row['num_tubes'], row['balls_per_tube'])
+        self.parameter_panel.update_corners_status(4)
+        self.parameter_panel.enable_generate_button(True)
+        
+        self.current_grid = self.grid_generator.generate_grid()
+        self.color_analyzer.clear_dendrogram()
+        if self.current_grid:
+            self.display_grid_visualization()
+            self.parameter_panel.update_grid_status(len(self.current_grid))
+            self.parameter_panel.enable_analyze_button(True)
+    
+    def save_calibration_profile(self):
+        """Save crop boxes and corners as the profile for the loaded image resolution"""
+        if self.image_processor.get_source_size() is None:
+            messagebox.showerror("Erreur", "Charger une image d'abord")
+            return
+        
+        if self.is_multi_row_mode:
+            self.save_current_row_data()
+            layout = self.multi_row_manager.get_rows_layout()
+        else:
+            layout = self.get_single_row_layout()
+        
+        if not layout:
+            messagebox.showerror("Erreur", "Recadrer et placer les 4 coins de chaque rangée d'abord")
+            return
+        
+        try:
+            width, height = self.image_processor.get_source_size()
+            key = self.calibration_profiles.save_profile(width, height, layout,
+                                                         1.0 / self.image_processor.load_scale)
+            self.parameter_panel.add_status_message(f"Profil de calibration enregistré: {key}")
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Erreur: {str(e)}")
+    
+    def get_single_row_layout(self):
+        """Get calibration layout of the current crop and corners (single row mode)"""
+        corners = self.grid_generator.get_corner_points()
+        if self.image_processor.crop_box is None or len(corners) != 4:
+            return None
+        
+        num_tubes, balls_per_tube = self.parameter_panel.get_tube_parameters()
+        return [{
+            'crop_box': list(self.image_processor.crop_box),
+            'corners': corners,
+            'radius': self.grid_generator.ball_radius,
+            'num_tubes': num_tubes,
+            'balls_per_tube': balls_per_tube
+        }]
+    
+    def save_session(self):
+        """Save multi-row state to a session file (image referenced by path)"""
+        if not self.is_multi_row_mode:
+            messagebox.showerror("Erreur", "Démarrer la configuration d'abord")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="Sauver la session",
+            defaultextension=".npz",
+            filetypes=[("Session", "*.npz")]
+        )
+        
+        if file_path:
+            try:
+                self.save_current_row_data()
+                image_info = {
+                    'path': self.image_processor.image_path,
+                    'max_analysis_size': self.image_processor.max_analysis_size
+                }
+                save_session(file_path, self.multi_row_manager, image_info)
+                self.parameter_panel.add_status_message(f"Session sauvée: {os.path.basename(file_path)}")
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Erreur: {str(e)}")
+    
+    def load_session(self):
+        """Restore multi-row state from a session file and reload its image"""
+        file_path = filedialog.askopenfilename(
+            title="Ouvrir une session",
+            filetypes=[("Session", "*.npz")]
+        )
+        
+        if not file_path:
+            return
+        
+        try:
+            image_info = load_session(file_path, self.multi_row_manager)
+            
+            # Pixels are not part of the session: decode the image again
+            image_path = image_info.get('path')
+            if image_path and os.path.exists(image_path):
+                if image_path.lower().endswith(self.RAW_FRAME_EXTENSIONS):
+                    self.image_processor.load_frame_file(image_path)
+                else:
+                    self.image_processor.set_max_analysis_size(image_info.get('max_analysis_size'))
+                    self.image_processor.load_image(image_path)
+                self.parameter_panel.enable_crop_button(True)
+                self.parameter_panel.enable_start_button(True)
+            else:
+                self.parameter_panel.add_status_message(f"Image introuvable: {image_path}")
+            
+            self.is_multi_row_mode = True
+            self.parameter_panel.set_num_rows(self.multi_row_manager.num_rows)
+            self.parameter_panel.show_navigation(True)
+            self.update_multi_row_ui()
+            self.load_current_row_data()
+            self.parameter_panel.add_status_message(f"Session restaurée: {os.path.basename(file_path)}")
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Erreur: {str(e)}")
+    
     def update_multi_row_ui(self):
         """Update UI for multi-row mode"""
         if not self.is_multi_row_mode:
@@ -486,116 +850,13 @@ class BallSortSolver:
         
         self.parameter_panel.update_navigation_buttons(is_first, is_last, can_finish, is_single_row)
     
-    def display_aggregated_results(self):
-        """Display aggregated results from all rows"""
-        results = self.multi_row_manager.get_aggregated_results()
-        
-        # Clear previous results
-        for widget in self.results_frame.winfo_children():
-            widget.destroy()
-        
-        # Title
-        title = tk.Label(self.results_frame, text="Résultats Globaux", 
-                        font=("Arial", 16, "bold"))
-        title.pack(pady=(0, 10))
-        
-        # Summary
-        summary_frame = tk.Frame(self.results_frame)
-        summary_frame.pack(fill=tk.X, pady=5)
-        
-        summary_text = f"Rangées analysées: {results['completed_rows']}/{results['total_rows']}\n"
-        summary_text += f"Total éprouvettes: {results['total_tubes']}\n"
-        summary_text += f"Total balles détectées: {results['total_balls']}"
-        
-        tk.Label(summary_frame, text=summary_text, 
-                font=("Arial", 12), justify=tk.LEFT).pack()
-        
-        # Colors by row
-        if results['colors_by_row']:
-            colors_frame = tk.Frame(self.results_frame)
-            colors_frame.pack(fill=tk.X, pady=10)
-            
-            tk.Label(colors_frame, text="Couleurs par rangée:", 
-                    font=("Arial", 12, "bold")).pack(anchor=tk.W)
-            
-            for color_key, balls in results['colors_by_row'].items():
-                color_frame = tk.Frame(colors_frame)
-                color_frame.pack(fill=tk.X, pady=2)
-                
-                # Extract color info
-                row_info, color = color_key.split('_', 1)
-                color_rgb = eval(color) if color.startswith('(') else (128, 128, 128)
-                
-                # Color sample
-                canvas = tk.Canvas(color_frame, width=25, height=25)
-                color_hex = f"#{color_rgb[0]:02x}{color_rgb[1]:02x}{color_rgb[2]:02x}"
-                canvas.create_rectangle(0, 0, 25, 25, fill=color_hex, outline="black")
-                canvas.pack(side=tk.LEFT, padx=(0, 10))
-                
-                # Label
-                tk.Label(color_frame, text=f"{row_info}: {len(balls)} balles").pack(side=tk.LEFT)
-    
     def create_grid_matrix(self):
         """Create matrix representation of grid"""
         if not self.current_grid:
             return []
         
-        # Get tube parameters
-        num_tubes, balls_per_tube = self.parameter_panel.get_tube_parameters()
-        
-        # Create matrix
-        matrix = []
-        for tube_idx in range(num_tubes):
-            tube_column = []
-            for ball_idx in range(balls_per_tube):
-                # Find matching grid point
-                grid_point = None
-                for circle in self.current_grid:
-                    if circle.get('tube_idx') == tube_idx and circle.get('ball_idx') == ball_idx:
-                        grid_point = {
-                            'x': circle['x'],
-                            'y': circle['y'],
-                            'radius': circle['radius']
-                        }
-                        break
-                tube_column.append(grid_point)
-            matrix.append(tube_column)
-        
-        return matrix
-    
-    def create_color_matrix(self, color_groups):
-        """Create matrix representation of colors"""
-        if not self.current_grid or not color_groups:
-            return []
-        
-        # Get tube parameters
         num_tubes, balls_per_tube = self.parameter_panel.get_tube_parameters()
-        
-        # Create matrix
-        matrix = []
-        for tube_idx in range(num_tubes):
-            tube_column = []
-            for ball_idx in range(balls_per_tube):
-                # Find color for this position
-                found_color = None
-                for color, balls in color_groups.items():
-                    for ball in balls:
-                        # Find corresponding grid position
-                        for circle in self.current_grid:
-                            if (abs(circle['x'] - ball['x']) < 10 and 
-                                abs(circle['y'] - ball['y']) < 10 and
-                                circle.get('tube_idx') == tube_idx and
-                                circle.get('ball_idx') == ball_idx):
-                                found_color = color
-                                break
-                        if found_color:
-                            break
-                    if found_color:
-                        break
-                tube_column.append(found_color)
-            matrix.append(tube_column)
-        
-        return matrix
+        return build_grid_matrix(self.current_grid, num_tubes, balls_per_tube)
     
     def show_final_results_window(self):
         """Show final results in separate window"""
@@ -607,139 +868,86 @@ class BallSortSolver:
         results_window.geometry("800x600")
         results_window.grab_set()
         
-        # Main scrollable frame
-        scrollable_frame = ctk.CTkScrollableFrame(results_window)
-        scrollable_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        # Main frame (the color list scrolls, not the whole window)
+        main_frame = ctk.CTkFrame(results_window, fg_color="transparent")
+        main_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
         # Title
-        title = ctk.CTkLabel(scrollable_frame, text="🏆 Résultats Finaux", 
+        title = ctk.CTkLabel(main_frame, text="🏆 Résultats Finaux", 
                             font=ctk.CTkFont(size=20, weight="bold"),
                             text_color="#2196F3")
-        title.pack(pady=(0, 20))
+        title.pack(pady=(0, 10))
         
         # Summary stats
-        summary_frame = ctk.CTkFrame(scrollable_frame, corner_radius=10)
-        summary_frame.pack(fill="x", pady=10)
+        summary_frame = ctk.CTkFrame(main_frame, corner_radius=10)
+        summary_frame.pack(fill="x", pady=5)
         
-        ctk.CTkLabel(summary_frame, text="📊 Résumé", 
-                    font=ctk.CTkFont(size=14, weight="bold")).pack(pady=(15, 10))
-        
-        stats_text = f"""Rangées analysées: {results['completed_rows']}/{results['total_rows']}
-Total éprouvettes: {results['total_tubes']}
-Total balles détectées: {results['total_balls']}"""
+        stats_text = f"""Rangées analysées: {results.completed_rows}/{results.total_rows}
+Total éprouvettes: {results.total_tubes}
+Total balles détectées: {results.total_balls}"""
         
         ctk.CTkLabel(summary_frame, text=stats_text, font=ctk.CTkFont(size=12), 
-                    justify="left").pack(padx=10, pady=(0, 15))
-        
-        # Combined color statistics
-        if results.get('combined_colors'):
-            combined_frame = ctk.CTkFrame(scrollable_frame, corner_radius=10)
-            combined_frame.pack(fill="x", pady=10)
-            
-            ctk.CTkLabel(combined_frame, text="🎨 Statistiques Globales des Couleurs",
-                        font=ctk.CTkFont(size=14, weight="bold")).pack(pady=(15, 10))
-            
-            # Sort colors by total count (descending)
-            sorted_colors = sorted(results['combined_colors'].items(), 
-                                 key=lambda x: x[1]['total_count'], reverse=True)
-            
-            for color_key, data in sorted_colors:
-                color_main_frame = ctk.CTkFrame(combined_frame, corner_radius=8)
-                color_main_frame.pack(fill="x", padx=10, pady=5)
-                
-                # Main color info
-                color_header = ctk.CTkFrame(color_main_frame)
-                color_header.pack(fill="x", padx=10, pady=10)
-                
-                # Color sample
-                try:
-                    # Get representative color from data
-                    color_rgb = data['representative_color']
-                    color_name = data['color_name']
-                    
-                    canvas_color = ctk.CTkCanvas(color_header, width=35, height=35)
-                    color_hex = f"#{color_rgb[0]:02x}{color_rgb[1]:02x}{color_rgb[2]:02x}"
-                    canvas_color.create_rectangle(0, 0, 35, 35, fill=color_hex, outline="black", width=2)
-                    canvas_color.pack(side="left", padx=(0, 15))
-                    
-                    # Total count with color name
-                    total_label = ctk.CTkLabel(color_header, 
-                                              text=f"{color_name}: {data['total_count']} balles au total",
-                                              font=ctk.CTkFont(size=12, weight="bold"),
-                                              text_color="#2196F3")
-                    total_label.pack(side="left", anchor="w")
-                    
-                    # Row breakdown
-                    breakdown_frame = ctk.CTkFrame(color_main_frame)
-                    breakdown_frame.pack(fill="x", padx=10, pady=(5, 10))
-                    
-                    breakdown_text = "Répartition: "
-                    row_details = []
-                    for row, count in data['rows'].items():
-                        row_details.append(f"{row}: {count}")
-                    breakdown_text += " | ".join(row_details)
-                    
-                    ctk.CTkLabel(breakdown_frame, text=breakdown_text, 
-                                font=ctk.CTkFont(size=10), text_color="#666666").pack(anchor="w", padx=10, pady=5)
-                    
-                except Exception as e:
-                    # Fallback if color parsing fails
-                    ctk.CTkLabel(color_header, 
-                                text=f"Couleur inconnue: {data['total_count']} balles au total",
-                                font=ctk.CTkFont(size=12, weight="bold")).pack()
-        
-        # Separator
-        separator = ctk.CTkFrame(scrollable_frame, height=2)
-        separator.pack(fill="x", pady=15)
-        
-        # Color details by row
-        if results['colors_by_row']:
-            colors_frame = ctk.CTkFrame(scrollable_frame, corner_radius=10)
-            colors_frame.pack(fill="x", pady=10)
-            
-            ctk.CTkLabel(colors_frame, text="📋 Détail par Rangée",
-                        font=ctk.CTkFont(size=14, weight="bold")).pack(pady=(15, 10))
-            
-            # Group by row
-            rows_colors = {}
-            for color_key, balls in results['colors_by_row'].items():
-                row_info, color = color_key.split('_', 1)
-                if row_info not in rows_colors:
-                    rows_colors[row_info] = []
-                rows_colors[row_info].append((color, len(balls)))
-            
-            for row_info, colors in rows_colors.items():
-                row_frame = ctk.CTkFrame(colors_frame, corner_radius=8)
-                row_frame.pack(fill="x", padx=10, pady=5)
-                
-                ctk.CTkLabel(row_frame, text=f"{row_info}:", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=10, pady=(10, 5))
-                
-                colors_grid = ctk.CTkFrame(row_frame)
-                colors_grid.pack(fill="x", padx=20, pady=(0, 10))
-                
-                for i, (color, count) in enumerate(colors):
-                    color_item = ctk.CTkFrame(colors_grid)
-                    color_item.pack(fill="x", pady=2)
-                    
-                    # Color sample
-                    try:
-                        color_rgb = eval(color) if color.startswith('(') else (128, 128, 128)
-                        canvas_color = ctk.CTkCanvas(color_item, width=25, height=25)
-                        color_hex = f"#{color_rgb[0]:02x}{color_rgb[1]:02x}{color_rgb[2]:02x}"
-                        canvas_color.create_rectangle(0, 0, 25, 25, fill=color_hex, outline="black")
-                        canvas_color.pack(side="left", padx=(10, 10))
-                        
-                        ctk.CTkLabel(color_item, text=f"Couleur {i+1}: {count} balles").pack(side="left", pady=5)
-                    except:
-                        ctk.CTkLabel(color_item, text=f"Couleur {i+1}: {count} balles").pack(pady=5)
-        
-        # Close button
-        close_frame = ctk.CTkFrame(scrollable_frame)
-        close_frame.pack(pady=20)
-        
-        ctk.CTkButton(close_frame, text="❌ Fermer", command=results_window.destroy,
+                    justify="left").pack(padx=10, pady=10)
+        
+        # Whole board at a glance: one image for all rows
+        color_matrices = [row_data['color_matrix'] for _, row_data in sorted(self.multi_row_manager.rows_data.items())
+                          if row_data['completed']]
+        TubeMatrixThumbnail(main_frame, color_matrices).pack(pady=5)
+        
+        # Combined colors then per-row detail, drawn only for visible lines
+        items = []
+        if results.combined_colors:
+            items.append({'text': "🎨 Statistiques Globales des Couleurs", 'header': True})
+            for combined in results.get_combined_by_count():
+                breakdown = " | ".join(f"{row_label(row_index)}: {count}"
+                                       for row_index, count in sorted(combined.row_counts.items()))
+                items.append({
+                    'text': f"{combined.name}: {combined.total_count} balles au total",
+                    'color': combined.rgb,
+                    'detail': breakdown
+                })
+        
+        if results.row_colors:
+            items.append({'text': "📋 Détail par Rangée", 'header': True})
+            for row_index, records in results.get_rows():
+                items.append({'text': f"{row_label(row_index)}:", 'header': True, 'indent': 1})
+                for i, record in enumerate(records):
+                    items.append({
+                        'text': f"Couleur {i+1}: {record.count} balles",
+                        'color': record.rgb,
+                        'indent': 2
+                    })
+        
+        results_list = VirtualResultsList(main_frame)
+        results_list.pack(fill="both", expand=True, pady=10)
+        results_list.set_items(items)
+        
+        # Export and close buttons
+        buttons_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        buttons_frame.pack(pady=(0, 5))
+        
+        ctk.CTkButton(buttons_frame, text="📤 Exporter matrices", command=self.export_matrices,
+                     font=ctk.CTkFont(size=12, weight="bold"), height=35).pack(side="left", padx=5)
+        ctk.CTkButton(buttons_frame, text="❌ Fermer", command=results_window.destroy,
                      fg_color="#f44336", hover_color="#da190b",
-                     font=ctk.CTkFont(size=12, weight="bold"), height=35).pack()
+                     font=ctk.CTkFont(size=12, weight="bold"), height=35).pack(side="left", padx=5)
+    
+    def export_matrices(self):
+        """Export the color matrices of all completed rows for solvers"""
+        file_path = filedialog.asksaveasfilename(
+            title="Exporter les matrices",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Binaire compact", "*.bsb"),
+                       ("Texte (une ligne)", "*.txt"), ("JSON lines", "*.jsonl")]
+        )
+        
+        if file_path:
+            try:
+                board = board_from_manager(self.multi_row_manager)
+                write_board(board, file_path)
+                self.parameter_panel.add_status_message(f"Matrices exportées: {os.path.basename(file_path)}")
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Erreur: {str(e)}")
     
     def on_tube_params_changed(self):
         """Called when tube parameters change in UI"""
@@ -855,6 +1063,42 @@ Couleurs différentes: {total_colors}"""
                      fg_color="#f44336", hover_color="#da190b",
                      font=ctk.CTkFont(size=12, weight="bold"), height=35).pack()
     
+    def on_span_recorded(self, span):
+        """Report pipeline stage timings in the status panel"""
+        if span['depth'] != 0 or span['name'] in self.quiet_spans:
+            return
+        if threading.current_thread() is not threading.main_thread():
+            # Tk is not thread-safe: worker spans are shown by the Tk thread
+            self.pending_spans.put(span)
+            return
+        self.parameter_panel.add_timing_message(span['name'], span['duration_ms'])
+    
+    def flush_pending_spans(self):
+        """Show timings recorded by worker threads"""
+        while True:
+            try:
+                span = self.pending_spans.get_nowait()
+            except queue.Empty:
+                return
+            self.parameter_panel.add_timing_message(span['name'], span['duration_ms'])
+    
+    def export_timings(self):
+        """Export recorded stage timings to JSON"""
+        file_path = filedialog.asksaveasfilename(
+            title="Exporter les mesures",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json")]
+        )
+        
+        if file_path:
+            try:
+                instrumentation.export_json(file_path)
+                for line in instrumentation.get_summary_lines():
+                    self.parameter_panel.add_status_message(line)
+                self.parameter_panel.add_status_message(f"Mesures exportées: {os.path.basename(file_path)}")
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Erreur: {str(e)}")
+    
     def display_aggregated_results(self):
         """Display aggregated results from all rows"""
         # Show in separate window instead of main UI
@@ -864,9 +1108,27 @@ Couleurs différentes: {total_colors}"""
         """Run app"""
         self.root.mainloop()
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Ball Sort Puzzle Solver")
+    parser.add_argument('--profile', nargs='?', const='ball_sort.pstats', metavar='FICHIER',
+                        help="Profiler la session avec cProfile et écrire un fichier pstats")
+    parser.add_argument('--decoder', choices=DECODER_BACKENDS, default='pil-draft',
+                        help="Décodeur des images (pil, pil-draft ou cv2)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        app = BallSortSolver()
-        app.run()
+        app = BallSortSolver(args.decoder)
+        if args.profile:
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(app.run)
+            finally:
+                profiler.dump_stats(args.profile)
+                print(f"Profil écrit: {args.profile}")
+        else:
+            app.run()
     except Exception as e:
         print(f"Erreur: {e}")
\ No newline at end of file
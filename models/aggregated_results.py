@@ -0,0 +1,79 @@
+"""
+Structured multi-row aggregation results (shared by the GUI and headless code)
+"""
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+def row_label(row_index):
+    """Display label of a 0-based row index"""
+    return f"R{row_index + 1}"
+
+@dataclass(frozen=True)
+class RowColorRecord:
+    """Color group detected in one row"""
+    row_index: int
+    color_id: int
+    rgb: tuple
+    count: int
+
+    @property
+    def row_label(self):
+        return row_label(self.row_index)
+
+@dataclass(frozen=True)
+class CombinedColor:
+    """Color merged across rows (color_id is shared with RowColorRecord)"""
+    color_id: int
+    rgb: tuple
+    name: str
+    total_count: int
+    row_counts: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+@dataclass(frozen=True)
+class AggregatedResults:
+    """Totals, per-row colors and combined colors of all completed rows
+
+    Frozen (tuples and read-only mappings): the manager memoizes one
+    instance and hands it to every caller.
+    """
+    total_balls: int = 0
+    total_tubes: int = 0
+    completed_rows: int = 0
+    total_rows: int = 0
+    row_colors: tuple = ()
+    combined_colors: tuple = ()
+
+    def get_row_colors(self, row_index):
+        """Get the color records of one row"""
+        return [record for record in self.row_colors if record.row_index == row_index]
+
+    def get_rows(self):
+        """Get (row_index, records) for every row with colors, in row order"""
+        rows = {}
+        for record in self.row_colors:
+            rows.setdefault(record.row_index, []).append(record)
+        return sorted(rows.items())
+
+    def get_combined_by_count(self):
+        """Get combined colors sorted by total count (descending)"""
+        return sorted(self.combined_colors, key=lambda color: color.total_count, reverse=True)
+
+    def to_dict(self):
+        """JSON-friendly representation"""
+        return {
+            'total_balls': self.total_balls,
+            'total_tubes': self.total_tubes,
+            'completed_rows': self.completed_rows,
+            'total_rows': self.total_rows,
+            'row_colors': [
+                {'row_index': record.row_index, 'color_id': record.color_id,
+                 'rgb': list(record.rgb), 'count': record.count}
+                for record in self.row_colors
+            ],
+            'combined_colors': [
+                {'color_id': color.color_id, 'rgb': list(color.rgb), 'name': color.name,
+                 'total_count': color.total_count,
+                 'row_counts': {str(row_index): count for row_index, count in color.row_counts.items()}}
+                for color in self.combined_colors
+            ]
+        }
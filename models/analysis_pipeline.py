@@ -0,0 +1,180 @@
+"""
+Headless analysis pipeline: ImageProcessor -> GridGenerator -> ColorAnalyzer
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from image_processor import ImageProcessor
+from grid_generator import GridGenerator, build_grid_matrix
+from color_analyzer import ColorAnalyzer
+from multi_row_manager import MultiRowManager
+from color_names import get_color_names
+from matrix_export import board_from_manager, board_to_json
+from board_detector import BoardDetector
+from instrumentation import timed
+
+@dataclass
+class RowAnalysis:
+    """Grid, color groups, matrices and JSON-friendly result of one row"""
+    row_index: int
+    grid: list
+    color_groups: dict
+    grid_matrix: list
+    color_matrix: list
+    slot_matrix: list
+    result: dict
+
+@timed('analysis_pipeline.analyze_row_image')
+def analyze_row_image(image, row_layout, tolerance=40, full_resolution_loader=None, row_index=0):
+    """Generate the grid of one row and analyze its colors on an image (crop view)
+
+    row_layout holds 'corners' (4 points in crop coordinates), 'radius',
+    'num_tubes' and 'balls_per_tube'. full_resolution_loader optionally
+    returns (full_resolution_image, scale) for re-sampling ambiguous balls.
+    Only reads the image, so rows can be analyzed in parallel threads.
+    """
+    grid_generator = GridGenerator()
+    corners = [{'x': int(p['x']), 'y': int(p['y'])} for p in row_layout['corners']]
+    if not grid_generator.set_corner_points(corners):
+        raise ValueError("4 coins sont requis")
+    grid_generator.set_ball_radius(int(row_layout.get('radius', 15)))
+    grid_generator.set_tube_parameters(int(row_layout.get('num_tubes', 5)),
+                                       int(row_layout.get('balls_per_tube', 4)))
+    num_tubes, balls_per_tube = grid_generator.get_tube_parameters()
+    grid = grid_generator.generate_grid()
+
+    color_analyzer = ColorAnalyzer()
+    color_analyzer.set_tolerance(tolerance)
+    if full_resolution_loader:
+        def load_full_resolution_grid():
+            full_image, scale = full_resolution_loader()
+            return full_image, grid_generator.scale_circles(grid, scale)
+        color_analyzer.set_refinement_source(load_full_resolution_grid)
+
+    detected = color_analyzer.analyze_grid_circles(image, grid)
+    color_groups = color_analyzer.group_balls_by_color(detected)
+    matrix = color_analyzer.build_color_matrix(num_tubes, balls_per_tube, color_groups)
+    slot_matrix = color_analyzer.build_slot_matrix(num_tubes, balls_per_tube, color_groups)
+
+    result = {
+        'num_tubes': num_tubes,
+        'balls_per_tube': balls_per_tube,
+        'total_balls': len(detected),
+        'expected_balls': grid_generator.get_expected_ball_count(),
+        'color_matrix': [[list(color) if color else None for color in tube] for tube in matrix],
+        'slot_matrix': slot_matrix,
+        'uncertain_slots': color_analyzer.count_uncertain_slots(slot_matrix),
+        'colors': [{'color': list(color), 'name': name, 'count': len(balls)}
+                   for (color, balls), name in zip(color_groups.items(), get_color_names(list(color_groups)))]
+    }
+    return RowAnalysis(row_index, grid, color_groups, build_grid_matrix(grid, num_tubes, balls_per_tube),
+                       matrix, slot_matrix, result)
+
+def analyze_row(image_processor, row_layout, tolerance=40):
+    """Analyze one row of a loaded image with a layout dict
+
+    Same layout as analyze_row_image, plus an optional 'crop_box' applied
+    to the image processor. Returns the JSON-friendly row result (with the
+    per-slot status matrix), the color groups and the color matrix.
+    """
+    crop_box = row_layout.get('crop_box')
+    if crop_box:
+        image_processor.crop_image(*crop_box)
+
+    analysis = analyze_row_image(image_processor.get_analysis_image(), row_layout, tolerance)
+    return analysis.result, analysis.color_groups, analysis.color_matrix
+
+@timed('analysis_pipeline.analyze_rows')
+def analyze_rows(image_processor, row_layouts, tolerance=40, max_workers=None):
+    """Analyze every row of a loaded image concurrently, one task per row
+
+    Each row reads a zero-copy view of its 'crop_box' (whole image if
+    missing) and the processor crop is left untouched; rows share no
+    state, so they run as tasks of a thread pool. Returns RowAnalysis
+    objects in row order.
+    """
+    downsampled = image_processor.is_downsampled()
+
+    def run(row_index):
+        row_layout = row_layouts[row_index]
+        crop_box = tuple(row_layout['crop_box']) if row_layout.get('crop_box') else None
+        loader = None
+        if downsampled:
+            loader = lambda: image_processor.get_full_resolution_view(crop_box)
+        return analyze_row_image(image_processor.get_crop_view(crop_box), row_layout,
+                                 tolerance, loader, row_index)
+
+    if len(row_layouts) < 2:
+        return [run(row_index) for row_index in range(len(row_layouts))]
+    with ThreadPoolExecutor(max_workers=max_workers or len(row_layouts)) as executor:
+        return list(executor.map(run, range(len(row_layouts))))
+
+def shift_corners(corners, dx, dy):
+    """Move corner points by (-dx, -dy), e.g. from image to crop coordinates"""
+    return [{'x': int(p['x']) - dx, 'y': int(p['y']) - dy} for p in corners]
+
+def auto_crop_rows(image_processor, rows):
+    """Fill missing row crop boxes with the rows found by BoardDetector
+
+    Rows without a 'crop_box' give their corners in image coordinates
+    (the client cannot know the detected box); they are shifted into the
+    detected box. Rows with a crop box are left as they are.
+    """
+    if all(row.get('crop_box') for row in rows):
+        return rows
+    boxes = BoardDetector().detect_rows(image_processor.source_array, len(rows))
+    if len(boxes) != len(rows):
+        raise ValueError("Rangées d'éprouvettes non détectées")
+    return [row if row.get('crop_box') else
+            dict(row, crop_box=list(box), corners=shift_corners(row['corners'], box[0], box[1]))
+            for row, box in zip(rows, boxes)]
+
+def store_row_analyses(multi_row_manager, analyses):
+    """Store row analyses in a MultiRowManager (current row is restored)"""
+    current_row = multi_row_manager.current_row
+    for analysis in analyses:
+        multi_row_manager.current_row = analysis.row_index
+        multi_row_manager.set_current_row_tube_params(analysis.result['num_tubes'],
+                                                      analysis.result['balls_per_tube'])
+        multi_row_manager.set_current_row_grid(analysis.grid)
+        multi_row_manager.set_current_row_colors(analysis.color_groups)
+        multi_row_manager.set_current_row_matrices(analysis.grid_matrix, analysis.color_matrix,
+                                                   analysis.slot_matrix)
+    multi_row_manager.current_row = current_row
+
+@timed('analysis_pipeline.analyze_image_bytes')
+def analyze_image_bytes(image_bytes, layout, decoder_backend='pil-draft'):
+    """Analyze an encoded image (PNG/JPEG bytes) with a layout dict
+
+    The layout is either a single row layout (see analyze_row) or a dict
+    with a 'rows' list; 'tolerance' applies to every row. With 'auto_crop'
+    set, rows without a 'crop_box' get the one found by BoardDetector and
+    their corners are read in image coordinates (see auto_crop_rows).
+    Every row result reports the crop box used. Colors are also
+    aggregated across rows (see AggregatedResults.to_dict) and returned
+    as a solver-ready board (see matrix_export). The layout 'decoder'
+    overrides decoder_backend (see DECODER_BACKENDS).
+    """
+    image_processor = ImageProcessor()
+    image_processor.set_decoder_backend(layout.get('decoder', decoder_backend))
+    image_processor.load_image(io.BytesIO(image_bytes))
+
+    tolerance = int(layout.get('tolerance', 40))
+    rows = layout.get('rows') or [layout]
+    if layout.get('auto_crop'):
+        rows = auto_crop_rows(image_processor, rows)
+
+    multi_row_manager = MultiRowManager()
+    multi_row_manager.set_num_rows(len(rows))
+    analyses = analyze_rows(image_processor, rows, tolerance)
+    store_row_analyses(multi_row_manager, analyses)
+    row_results = [dict(analysis.result, crop_box=list(row['crop_box']) if row.get('crop_box') else None)
+                   for analysis, row in zip(analyses, rows)]
+    
+    height, width = image_processor.source_array.shape[:2]
+    return {
+        'image_size': [width, height],
+        'rows': row_results,
+        'aggregated': multi_row_manager.get_aggregated_results().to_dict(),
+        'board': board_to_json(board_from_manager(multi_row_manager))
+    }
@@ -0,0 +1,152 @@
+"""
+Automatic board detection: tube area and per-row crop boxes
+"""
+import numpy as np
+from instrumentation import timed
+
+try:
+    import cv2
+except ImportError:  # NumPy fallback
+    cv2 = None
+
+class BoardDetector:
+    def __init__(self, max_size=400, saturation_threshold=80, min_value=60, edge_threshold=60,
+                 min_band_fraction=0.04, margin_fraction=0.03):
+        # Detection runs on a copy whose longest side is at most max_size
+        self.max_size = max_size
+        # Saturation of dark pixels is noise: only pixels brighter than min_value count
+        self.saturation_threshold = saturation_threshold
+        self.min_value = min_value
+        self.edge_threshold = edge_threshold
+        # Bands thinner than this share of the board height are noise
+        self.min_band_fraction = min_band_fraction
+        # Padding added around each detected box (share of its size)
+        self.margin_fraction = margin_fraction
+
+    def downsample(self, image):
+        """Get a reduced RGB array of an image (PIL or array) and its scale"""
+        pixels = image if isinstance(image, np.ndarray) else np.asarray(image.convert('RGB'))
+        height, width = pixels.shape[:2]
+        scale = min(1.0, self.max_size / max(width, height))
+        if scale == 1.0:
+            return pixels[..., :3], 1.0
+
+        if cv2 is not None:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            return cv2.resize(np.ascontiguousarray(pixels[..., :3]), size, interpolation=cv2.INTER_AREA), scale
+
+        step = int(np.ceil(1 / scale))
+        return pixels[::step, ::step, :3], 1.0 / step
+
+    def build_activity_map(self, small):
+        """Mark pixels that are saturated (balls) or on strong edges (tubes)"""
+        if cv2 is not None:
+            hsv = cv2.cvtColor(np.ascontiguousarray(small), cv2.COLOR_RGB2HSV)
+            gray = cv2.cvtColor(np.ascontiguousarray(small), cv2.COLOR_RGB2GRAY)
+            edges = cv2.Canny(gray, self.edge_threshold, self.edge_threshold * 2) > 0
+            saturated = (hsv[..., 1] > self.saturation_threshold) & (hsv[..., 2] > self.min_value)
+            mask = saturated | edges
+            kernel = np.ones((3, 3), dtype=np.uint8)
+            return cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_CLOSE, kernel) > 0
+
+        channels = small.astype(np.int16)
+        high = channels.max(axis=2)
+        low = channels.min(axis=2)
+        saturation = (high - low) * 255 // np.maximum(high, 1)
+        saturated = (saturation > self.saturation_threshold) & (high > self.min_value)
+
+        gray = channels.mean(axis=2)
+        gradient = np.zeros_like(gray)
+        gradient[:, 1:] = np.abs(np.diff(gray, axis=1))
+        gradient[1:, :] = np.maximum(gradient[1:, :], np.abs(np.diff(gray, axis=0)))
+        return saturated | (gradient > self.edge_threshold)
+
+    def find_bands(self, profile, threshold, merge_gap, min_length):
+        """Get (start, end) runs where a profile exceeds a threshold
+
+        Runs separated by fewer than merge_gap samples (or than a typical
+        run length, e.g. the gaps between balls of a tube) are joined and
+        runs shorter than min_length are dropped.
+        """
+        active = np.concatenate(([False], profile > threshold, [False]))
+        changes = np.flatnonzero(active[1:] != active[:-1])
+        runs = list(zip(changes[::2].tolist(), changes[1::2].tolist()))
+        if runs:
+            merge_gap = max(merge_gap, int(np.percentile([end - start for start, end in runs], 75)))
+
+        bands = []
+        for start, end in runs:
+            if bands and start - bands[-1][1] < merge_gap:
+                bands[-1] = (bands[-1][0], end)
+            else:
+                bands.append((start, end))
+        return [(start, end) for start, end in bands if end - start >= min_length]
+
+    def fit_band_count(self, bands, count):
+        """Merge the closest bands or split the tallest ones to get count bands"""
+        bands = list(bands)
+        while len(bands) > count:
+            gaps = [bands[i + 1][0] - bands[i][1] for i in range(len(bands) - 1)]
+            i = int(np.argmin(gaps))
+            bands[i:i + 2] = [(bands[i][0], bands[i + 1][1])]
+        while bands and len(bands) < count:
+            i = max(range(len(bands)), key=lambda k: bands[k][1] - bands[k][0])
+            start, end = bands[i]
+            middle = (start + end) // 2
+            bands[i:i + 1] = [(start, middle), (middle, end)]
+        return bands
+
+    def to_source_box(self, box, scale, width, height):
+        """Pad a box of the reduced map and convert it to source coordinates"""
+        left, top, right, bottom = box
+        pad_x = (right - left) * self.margin_fraction
+        pad_y = (bottom - top) * self.margin_fraction
+        return (max(0, int((left - pad_x) / scale)), max(0, int((top - pad_y) / scale)),
+                min(width, int(np.ceil((right + pad_x) / scale))),
+                min(height, int(np.ceil((bottom + pad_y) / scale))))
+
+    def detect_board(self, image):
+        """Get the bounding box (left, top, right, bottom) of the tube area (None if not found)"""
+        rows = self.detect_rows(image)
+        if not rows:
+            return None
+        return (min(box[0] for box in rows), min(box[1] for box in rows),
+                max(box[2] for box in rows), max(box[3] for box in rows))
+
+    @timed('BoardDetector.detect_rows')
+    def detect_rows(self, image, num_rows=None):
+        """Propose one crop box per row of tubes, top to bottom, in image coordinates
+
+        Rows are the horizontal bands of the activity map (saturated or
+        edge pixels); num_rows forces the band count. Returns [] when the
+        image has no board-like content.
+        """
+        if image is None:
+            return []
+        pixels = image if isinstance(image, np.ndarray) else np.asarray(image.convert('RGB'))
+        height, width = pixels.shape[:2]
+
+        small, scale = self.downsample(pixels)
+        activity = self.build_activity_map(small)
+        small_height, small_width = activity.shape
+        min_length = max(2, int(small_height * self.min_band_fraction))
+
+        row_profile = activity.mean(axis=1)
+        if not row_profile.max():
+            return []
+        bands = self.find_bands(row_profile, row_profile.max() * 0.2,
+                                max(2, small_height // 50), min_length)
+        if num_rows:
+            bands = self.fit_band_count(bands, num_rows)
+
+        boxes = []
+        for top, bottom in bands:
+            column_profile = activity[top:bottom].mean(axis=0)
+            columns = self.find_bands(column_profile, column_profile.max() * 0.1,
+                                      max(2, small_width // 6), 1)
+            if not columns:
+                continue
+            # The widest run of columns is the tube area of the row
+            left, right = max(columns, key=lambda run: run[1] - run[0])
+            boxes.append(self.to_source_box((left, top, right, bottom), scale, width, height))
+        return boxes
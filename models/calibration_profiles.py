@@ -0,0 +1,104 @@
+"""
+Reusable layout calibration profiles keyed by image resolution
+"""
+import json
+import os
+
+DEFAULT_PROFILES_PATH = os.path.join(os.path.expanduser('~'), '.ball_sort_profiles.json')
+
+class CalibrationProfiles:
+    def __init__(self, profiles_path=DEFAULT_PROFILES_PATH, aspect_tolerance=0.01):
+        """Store of calibration profiles (crop box, corners, radius, tubes per row)
+
+        Coordinates are stored in full resolution pixels of the source image
+        so a profile applies the same way in normal and fast mode.
+        """
+        self.profiles_path = profiles_path
+        self.aspect_tolerance = aspect_tolerance
+        self.profiles = {}
+        self.load()
+
+    def load(self):
+        """Load profiles from disk (missing or unreadable file gives no profiles)"""
+        self.profiles = {}
+        if not os.path.exists(self.profiles_path):
+            return
+        try:
+            with open(self.profiles_path, 'r', encoding='utf-8') as f:
+                self.profiles = json.load(f)
+        except (OSError, ValueError):
+            self.profiles = {}
+
+    def save(self):
+        """Write all profiles to disk"""
+        with open(self.profiles_path, 'w', encoding='utf-8') as f:
+            json.dump(self.profiles, f, indent=2)
+
+    def get_profile_key(self, width, height):
+        """Profile key for an image resolution"""
+        return f"{width}x{height}"
+
+    def save_profile(self, width, height, rows, scale=1.0):
+        """Save a profile for a source resolution
+
+        rows is a list of row layouts in working image coordinates
+        ('crop_box', 'corners', 'radius', 'num_tubes', 'balls_per_tube');
+        scale converts them to full resolution (1 / load_scale in fast mode).
+        """
+        key = self.get_profile_key(width, height)
+        self.profiles[key] = {
+            'width': width,
+            'height': height,
+            'rows': self.scale_rows(rows, scale)
+        }
+        self.save()
+        return key
+
+    def delete_profile(self, width, height):
+        """Delete the profile of a resolution"""
+        key = self.get_profile_key(width, height)
+        if key in self.profiles:
+            del self.profiles[key]
+            self.save()
+            return True
+        return False
+
+    def find_profile(self, width, height):
+        """Find the profile for a source resolution
+
+        An exact resolution match is used as is; otherwise the profile with
+        the closest aspect ratio (within tolerance) is scaled to this size.
+        Returns (rows, key) in full resolution coordinates or (None, None).
+        """
+        key = self.get_profile_key(width, height)
+        if key in self.profiles:
+            return self.profiles[key]['rows'], key
+
+        aspect = width / height
+        best_key = None
+        best_difference = self.aspect_tolerance
+        for profile_key, profile in self.profiles.items():
+            difference = abs(profile['width'] / profile['height'] - aspect)
+            if difference <= best_difference:
+                best_key = profile_key
+                best_difference = difference
+
+        if best_key is None:
+            return None, None
+
+        profile = self.profiles[best_key]
+        return self.scale_rows(profile['rows'], width / profile['width']), best_key
+
+    def scale_rows(self, rows, scale):
+        """Scale every coordinate of a list of row layouts"""
+        scaled_rows = []
+        for row in rows:
+            scaled_rows.append({
+                'crop_box': [int(round(v * scale)) for v in row['crop_box']],
+                'corners': [{'x': int(round(p['x'] * scale)), 'y': int(round(p['y'] * scale))}
+                            for p in row['corners']],
+                'radius': max(5, int(round(row['radius'] * scale))),
+                'num_tubes': int(row['num_tubes']),
+                'balls_per_tube': int(row['balls_per_tube'])
+            })
+        return scaled_rows
@@ -3,12 +3,45 @@ Color analysis for ball detection
 """
 from collections import Counter
 import math
+import numpy as np
+from instrumentation import timed
+from color_dendrogram import ColorDendrogram
 
 class ColorAnalyzer:
     def __init__(self, tolerance=40):
         self.tolerance = tolerance
         self.detected_balls = []
         self.color_groups = {}
+        
+        # Full resolution re-sampling of ambiguous balls
+        self.refinement_source = None
+        self.ambiguity_threshold = 0.6
+        self.min_valid_fraction = 0.15
+        
+        # Sampling offsets per radius and density (shared by every circle of a grid)
+        self.sample_offsets_cache = {}
+        
+        # Sparse pattern by default; low-confidence circles are re-sampled densely
+        self.sparse_sampling = True
+        self.sparse_step = 3
+        self.dense_step = 2
+        
+        # Dominant color: 'quantized' (vectorized histogram) or 'exact' (RGB tuple counts)
+        self.color_mode = 'quantized'
+        self.quantization_bits = 5
+        
+        # Incremental mode: previous frame signatures and balls per grid position
+        self.circle_signatures = {}
+        self.circle_balls = {}
+        self.signature_stride = 4
+        self.change_threshold = 10.0
+        
+        # Single-linkage tree of the last grouped balls (regrouping without sampling)
+        self.dendrogram = None
+        self.dendrogram_balls = None
+        
+        # Status of every grid slot of the last analysis: 'ball', 'empty' or 'uncertain'
+        self.slot_states = {}
     
     def set_tolerance(self, tolerance):
         """Set color similarity tolerance"""
@@ -28,35 +61,33 @@ class ColorAnalyzer:
     
     def get_dominant_color_in_circle(self, image, x, y, radius):
         """Extract dominant color from circular region"""
-        if not image:
-            return None
-        
-        width, height = image.size
-        color_histogram = {}
-        sample_count = 0
+        return self.get_circle_color_stats(image, x, y, radius)['color']
+    
+    def get_circle_color_stats(self, image, x, y, radius, dense=True):
+        """Extract dominant color and sampling statistics from circular region
+
+        Returns a dict with the dominant 'color', its 'support' (share of
+        valid samples similar to it) and 'valid_fraction' (share of samples
+        that are neither gray, too dark nor too bright).
+        """
+        if self.color_mode == 'quantized':
+            return self.compute_quantized_stats(image, [{'x': x, 'y': y, 'radius': radius}], dense)[0]
         
-        # Sample pixels within the circle (inner 70% to avoid edges)
-        inner_radius = int(radius * 0.7)
+        stats = {'color': None, 'support': 0.0, 'valid_fraction': 0.0}
+        if image is None:
+            return stats
         
-        for r in range(0, inner_radius, 2):
-            circumference = max(1, int(2 * math.pi * r))
-            angle_step = 360 / circumference
-            
-            for angle in range(0, 360, max(1, int(angle_step))):
-                px = int(x + r * math.cos(math.radians(angle)))
-                py = int(y + r * math.sin(math.radians(angle)))
-                
-                if 0 <= px < width and 0 <= py < height:
-                    color = image.getpixel((px, py))
-                    color_histogram[color] = color_histogram.get(color, 0) + 1
-                    sample_count += 1
+        samples = self.sample_circle_pixels(image, x, y, radius, dense)
+        sample_count = len(samples)
+        if not sample_count:
+            return stats
         
-        if not color_histogram:
-            return None
+        color_histogram = Counter(samples)
         
         # Find dominant color (exclude very dark/light/gray colors)
         dominant_color = None
         max_count = 0
+        valid_colors = {}
         
         for color, count in color_histogram.items():
             r, g, b = color
@@ -67,68 +98,541 @@ class ColorAnalyzer:
             # - Not too dark or too bright
             # - Has some color variance (not gray)
             # - Most frequent color
-            if (30 < brightness < 220 and 
-                color_variance > 15 and 
-                count > max_count):
-                dominant_color = color
-                max_count = count
+            if 30 < brightness < 220 and color_variance > 15:
+                valid_colors[color] = count
+                if count > max_count:
+                    dominant_color = color
+                    max_count = count
+        
+        valid_count = sum(valid_colors.values())
+        stats['color'] = dominant_color
+        stats['valid_fraction'] = valid_count / sample_count
+        
+        if dominant_color:
+            similar_count = sum(count for color, count in valid_colors.items()
+                                if self.colors_similar(color, dominant_color))
+            stats['support'] = similar_count / valid_count
+        
+        return stats
+    
+    @timed('ColorAnalyzer.compute_quantized_stats')
+    def compute_quantized_stats(self, image, circles, dense=True):
+        """Color statistics of many circles at once from quantized histograms
+
+        Samples are quantized to quantization_bits per channel and packed
+        into one integer; a single np.bincount over (circle, color) keys
+        gives the mode of every circle, refined to the mean of the samples
+        in the mode bin. Same statistics as get_circle_color_stats.
+        """
+        results = [{'color': None, 'support': 0.0, 'valid_fraction': 0.0} for _ in circles]
+        if image is None or not circles:
+            return results
+        
+        pixels = image if isinstance(image, np.ndarray) else np.asarray(image.convert('RGB'))
+        height, width = pixels.shape[:2]
+        bits = self.quantization_bits
+        
+        # Circles of a grid share their radius, hence their sampling offsets
+        by_radius = {}
+        for idx, circle in enumerate(circles):
+            by_radius.setdefault(circle['radius'], []).append(idx)
+        
+        for radius, members in by_radius.items():
+            offsets = np.array(self.get_sample_offsets(radius, dense), dtype=np.int64).reshape(-1, 2)
+            centers = np.array([(circles[idx]['x'], circles[idx]['y']) for idx in members], dtype=np.int64)
+            coords = centers[:, None, :] + offsets[None, :, :]
+            inside = ((coords[..., 0] >= 0) & (coords[..., 0] < width) &
+                      (coords[..., 1] >= 0) & (coords[..., 1] < height))
+            samples = pixels[np.clip(coords[..., 1], 0, height - 1),
+                             np.clip(coords[..., 0], 0, width - 1), :3].astype(np.int32)
+            
+            # Same filter as the exact mode: not too dark/bright, not gray
+            brightness = samples.sum(axis=2)
+            spread = samples.max(axis=2) - samples.min(axis=2)
+            valid = inside & (brightness > 90) & (brightness < 660) & (spread > 15)
+            
+            shift = 8 - bits
+            keys = (((samples[..., 0] >> shift) << (2 * bits)) |
+                    ((samples[..., 1] >> shift) << bits) |
+                    (samples[..., 2] >> shift))
+            
+            circle_ids = np.broadcast_to(np.arange(len(members))[:, None], keys.shape)
+            packed = (circle_ids[valid].astype(np.int64) << (3 * bits)) | keys[valid]
+            if not len(packed):
+                valid_counts = np.zeros(len(members))
+            else:
+                bins, inverse = np.unique(packed, return_inverse=True)
+                counts = np.bincount(inverse.ravel())
+                bin_circles = bins >> (3 * bits)
+                
+                # Most populated bin of each circle (ties go to the lowest key)
+                order = np.lexsort((-counts, bin_circles))
+                first = np.ones(len(order), dtype=bool)
+                first[1:] = bin_circles[order][1:] != bin_circles[order][:-1]
+                mode_keys = np.full(len(members), -1, dtype=np.int64)
+                mode_keys[bin_circles[order][first]] = bins[order][first] & ((1 << (3 * bits)) - 1)
+                
+                in_mode = valid & (keys == mode_keys[:, None])
+                mode_counts = in_mode.sum(axis=1)
+                colors = np.rint((samples * in_mode[..., None]).sum(axis=1) /
+                                 np.maximum(mode_counts, 1)[:, None]).astype(np.int32)
+                
+                similar = valid & (np.abs(samples - colors[:, None, :]).sum(axis=2) < self.tolerance)
+                valid_counts = valid.sum(axis=1)
+                
+                for member_idx, idx in enumerate(members):
+                    if mode_counts[member_idx]:
+                        results[idx]['color'] = tuple(colors[member_idx].tolist())
+                        results[idx]['support'] = float(similar[member_idx].sum() / valid_counts[member_idx])
+            
+            sample_counts = inside.sum(axis=1)
+            for member_idx, idx in enumerate(members):
+                if sample_counts[member_idx]:
+                    results[idx]['valid_fraction'] = float(valid_counts[member_idx] / sample_counts[member_idx])
+        
+        return results
+    
+    def get_sample_offsets(self, radius, dense=True):
+        """Get (dx, dy) sampling offsets for a circle radius (inner 70%)
+
+        The dense pattern takes rings every 2px with a sample per pixel of
+        arc; the sparse one takes rings and arc samples every 3px.
+        """
+        key = (radius, dense)
+        if key in self.sample_offsets_cache:
+            return self.sample_offsets_cache[key]
+        
+        step = self.dense_step if dense else self.sparse_step
+        arc_step = 1 if dense else self.sparse_step
+        offsets = []
+        inner_radius = int(radius * 0.7)
+        
+        for r in range(0, inner_radius, step):
+            circumference = max(1, int(2 * math.pi * r))
+            angle_step = 360 * arc_step / circumference
+            
+            for angle in range(0, 360, max(1, int(angle_step))):
+                offsets.append((math.floor(r * math.cos(math.radians(angle))),
+                                math.floor(r * math.sin(math.radians(angle)))))
+        
+        self.sample_offsets_cache[key] = offsets
+        return offsets
+    
+    def get_image_size(self, image):
+        """Get (width, height) of a PIL image or an H x W x 3 array"""
+        if isinstance(image, np.ndarray):
+            return image.shape[1], image.shape[0]
+        return image.size
+    
+    def sample_circle_pixels(self, image, x, y, radius, dense=True):
+        """Get RGB tuples sampled inside a circle (PIL image or array view)"""
+        width, height = self.get_image_size(image)
+        offsets = self.get_sample_offsets(radius, dense)
+        
+        if isinstance(image, np.ndarray):
+            # Gather all samples in one indexing operation, no full-frame copy
+            coords = np.array(offsets, dtype=np.int64).reshape(-1, 2) + (x, y)
+            inside = ((coords[:, 0] >= 0) & (coords[:, 0] < width) &
+                      (coords[:, 1] >= 0) & (coords[:, 1] < height))
+            coords = coords[inside]
+            pixels = image[coords[:, 1], coords[:, 0]]
+            return [tuple(pixel) for pixel in pixels.tolist()]
+        
+        samples = []
+        for dx, dy in offsets:
+            px = x + dx
+            py = y + dy
+            if 0 <= px < width and 0 <= py < height:
+                samples.append(image.getpixel((px, py)))
+        return samples
+    
+    def set_refinement_source(self, loader):
+        """Set a callable returning (full_resolution_image, full_resolution_circles)
+
+        When set, balls whose dominant color is ambiguous on the working image
+        are re-sampled on the full resolution image. The loader is only
+        called if at least one ball needs it.
+        """
+        self.refinement_source = loader
+    
+    def is_ambiguous(self, stats):
+        """Check if circle statistics are too weak to trust the dominant color"""
+        if stats['valid_fraction'] < self.min_valid_fraction:
+            # Background (empty slot): nothing to refine
+            return False
+        return (stats['color'] is None or
+                stats['support'] < self.ambiguity_threshold or
+                stats['valid_fraction'] < 0.5)
+    
+    def compute_circle_stats(self, image, circles, indices=None):
+        """Compute color statistics for the given circle indices (all by default)
+
+        Circles are sampled with the sparse pattern first; ambiguous ones are
+        re-sampled with the dense pattern, then on the full resolution image
+        when a refinement source is set.
+        """
+        if indices is None:
+            indices = range(len(circles))
+        indices = list(indices)
+        
+        circle_stats = self.get_circles_stats(image, circles, indices, not self.sparse_sampling)
+        if self.sparse_sampling:
+            weak = [idx for idx in indices if self.is_ambiguous(circle_stats[idx])]
+            circle_stats.update(self.get_circles_stats(image, circles, weak, True))
+        
+        # Go back to full resolution only for ambiguous balls
+        if self.refinement_source:
+            ambiguous = [idx for idx in indices if self.is_ambiguous(circle_stats[idx])]
+            if ambiguous:
+                full_image, full_circles = self.refinement_source()
+                circle_stats.update(self.get_circles_stats(full_image, full_circles, ambiguous, True))
+        
+        return circle_stats
+    
+    def get_circles_stats(self, image, circles, indices, dense):
+        """Get {index: stats} for the given circle indices (one batch in quantized mode)"""
+        if not indices:
+            return {}
+        if self.color_mode == 'quantized':
+            batch = self.compute_quantized_stats(image, [circles[idx] for idx in indices], dense)
+            return dict(zip(indices, batch))
+        return {idx: self.get_circle_color_stats(image, circles[idx]['x'], circles[idx]['y'],
+                                                 circles[idx]['radius'], dense)
+                for idx in indices}
+    
+    def make_ball_info(self, circle, color, support=1.0):
+        """Build the detected ball record for a circle"""
+        return {
+            'x': circle['x'],
+            'y': circle['y'],
+            'radius': circle['radius'],
+            'color': color,
+            'support': support,
+            'grid_position': (circle.get('grid_i', 0), circle.get('grid_j', 0))
+        }
+    
+    def make_slot_state(self, stats):
+        """Classify a slot from its circle statistics
+
+        Returns a dict with 'status' ('empty' for background, 'uncertain'
+        for weak color evidence, 'ball' otherwise), the dominant 'color'
+        (None for empty slots) and a 'confidence' between 0 and 1.
+        """
+        if stats['valid_fraction'] < self.min_valid_fraction:
+            confidence = 1.0 - stats['valid_fraction'] / self.min_valid_fraction
+            return {'status': 'empty', 'color': None, 'confidence': round(confidence, 3)}
         
-        return dominant_color
+        confidence = stats['support'] * min(1.0, stats['valid_fraction'] / 0.5)
+        status = 'uncertain' if self.is_ambiguous(stats) else 'ball'
+        return {'status': status, 'color': stats['color'], 'support': stats['support'],
+                'confidence': round(confidence, 3)}
     
+    @timed('ColorAnalyzer.analyze_grid_circles')
     def analyze_grid_circles(self, image, circles):
-        """Analyze all circles in the grid for colors"""
-        if not image or not circles:
+        """Analyze all circles in the grid for colors (PIL image or array view)"""
+        if image is None or not circles:
             return []
         
         self.detected_balls = []
+        self.slot_states = {}
+        circle_stats = self.compute_circle_stats(image, circles)
         
-        for circle in circles:
-            dominant_color = self.get_dominant_color_in_circle(
-                image, circle['x'], circle['y'], circle['radius']
-            )
+        for idx, circle in enumerate(circles):
+            slot_state = self.make_slot_state(circle_stats[idx])
+            self.slot_states[(circle.get('grid_i', 0), circle.get('grid_j', 0))] = slot_state
             
-            if dominant_color:
-                ball_info = {
-                    'x': circle['x'],
-                    'y': circle['y'],
-                    'radius': circle['radius'],
-                    'color': dominant_color,
-                    'grid_position': (circle.get('grid_i', 0), circle.get('grid_j', 0))
-                }
-                self.detected_balls.append(ball_info)
+            # Uncertain slots with a color are kept as balls (flagged in the slot matrix)
+            if slot_state['color']:
+                self.detected_balls.append(self.make_ball_info(circle, slot_state['color'], slot_state['support']))
         
         return self.detected_balls
     
+    def get_circle_signature(self, image, circle):
+        """Sparse pixel samples of a circle used to detect changes between frames"""
+        samples = self.sample_circle_pixels(image, circle['x'], circle['y'], circle['radius'])
+        return np.array(samples[::self.signature_stride], dtype=np.int16)
+    
+    def signature_changed(self, signature, previous):
+        """Check if a circle signature moved beyond the change threshold"""
+        if previous is None or previous.shape != signature.shape:
+            return True
+        if not len(signature):
+            return False
+        return float(np.abs(signature - previous).mean()) > self.change_threshold
+    
+    def reset_incremental_state(self):
+        """Forget previous frame signatures (next incremental call is a full analysis)"""
+        self.circle_signatures = {}
+        self.circle_balls = {}
+        self.color_groups = {}
+        self.slot_states = {}
+    
+    @timed('ColorAnalyzer.analyze_grid_circles_incremental')
+    def analyze_grid_circles_incremental(self, image, circles):
+        """Re-analyze only circles whose pixels changed since the previous frame
+
+        Dominant colors are recomputed only for changed circles; when a ball
+        changed, color_groups is rebuilt from the updated ball list through
+        the same single-linkage path as a full analysis (see regroup_balls).
+        Returns the grid positions that changed. Call
+        reset_incremental_state() after changing the grid.
+        """
+        if image is None or not circles:
+            return []
+        
+        if not self.circle_signatures:
+            # First frame: groups are rebuilt from scratch
+            self.reset_incremental_state()
+        
+        changed = []
+        for idx, circle in enumerate(circles):
+            position = (circle.get('grid_i', 0), circle.get('grid_j', 0))
+            signature = self.get_circle_signature(image, circle)
+            if self.signature_changed(signature, self.circle_signatures.get(position)):
+                self.circle_signatures[position] = signature
+                changed.append(idx)
+        
+        if not changed:
+            return []
+        
+        circle_stats = self.compute_circle_stats(image, circles, changed)
+        changed_positions = []
+        
+        for idx in changed:
+            circle = circles[idx]
+            position = (circle.get('grid_i', 0), circle.get('grid_j', 0))
+            slot_state = self.make_slot_state(circle_stats[idx])
+            self.slot_states[position] = slot_state
+            dominant_color = slot_state['color']
+            
+            old_ball = self.circle_balls.get(position)
+            if old_ball is None and dominant_color is None:
+                continue
+            if old_ball is not None and old_ball['color'] == dominant_color:
+                continue
+            
+            if dominant_color:
+                self.circle_balls[position] = self.make_ball_info(circle, dominant_color,
+                                                                  slot_state['support'])
+            else:
+                self.circle_balls.pop(position, None)
+            
+            changed_positions.append(position)
+        
+        # Keep detected balls in grid order
+        self.detected_balls = []
+        for circle in circles:
+            ball = self.circle_balls.get((circle.get('grid_i', 0), circle.get('grid_j', 0)))
+            if ball is not None:
+                self.detected_balls.append(ball)
+        
+        if changed_positions:
+            # Same grouping as a fresh analysis of the updated balls
+            self.clear_dendrogram()
+            self.get_dendrogram(self.detected_balls)
+            self.color_groups = self.regroup_balls(self.tolerance)
+        
+        return changed_positions
+    
+    def get_dendrogram(self, balls):
+        """Get the single-linkage tree of the balls' colors (built once per ball list)"""
+        if self.dendrogram is None or self.dendrogram_balls is not balls:
+            self.dendrogram = ColorDendrogram([ball['color'] for ball in balls])
+            self.dendrogram_balls = balls
+        return self.dendrogram
+    
+    @timed('ColorAnalyzer.group_balls_by_color')
     def group_balls_by_color(self, balls=None):
-        """Group balls by similar colors"""
+        """Group balls by similar colors
+
+        Balls are linked when their colors are closer than the tolerance
+        (single linkage); each group is keyed by the color of its first
+        ball. The tree is kept, see regroup_balls.
+        """
         if balls is None:
             balls = self.detected_balls
         
         if not balls:
             return {}
         
-        color_groups = {}
+        labels = self.get_dendrogram(balls).cut(self.tolerance)
         
-        for ball in balls:
-            ball_color = ball['color']
-            
-            # Find existing similar color group
-            group_key = None
-            for existing_color in color_groups.keys():
-                if self.colors_similar(ball_color, existing_color):
-                    group_key = existing_color
-                    break
-            
-            # Create new group if no similar color found
-            if group_key is None:
-                group_key = ball_color
-                color_groups[group_key] = []
-            
-            color_groups[group_key].append(ball)
+        group_keys = {}
+        color_groups = {}
+        for ball, label in zip(balls, labels):
+            if label not in group_keys:
+                group_keys[label] = ball['color']
+                color_groups[ball['color']] = []
+            color_groups[group_keys[label]].append(ball)
         
+        self.set_ball_confidences(balls, labels)
         self.color_groups = color_groups
         return color_groups
     
+    def set_ball_confidences(self, balls, labels):
+        """Store each ball's 'separation' and 'confidence' in place
+
+        Distances are Manhattan distances from the ball color to the group
+        centroids (n x k, k groups). The separation is the distance to the
+        nearest other centroid minus the distance to the ball's own one.
+        The confidence is the ball support (share of its samples near the
+        dominant color), scaled down when the separation is less than twice
+        the tolerance.
+        """
+        colors = np.array([ball['color'] for ball in balls], dtype=np.float64).reshape(-1, 3)
+        _, labels = np.unique(np.asarray(labels), return_inverse=True)
+        labels = labels.reshape(-1)
+        num_groups = labels.max() + 1 if len(labels) else 0
+        
+        counts = np.bincount(labels, minlength=num_groups)
+        centroids = np.stack([np.bincount(labels, weights=colors[:, channel], minlength=num_groups)
+                              for channel in range(3)], axis=1) / np.maximum(counts, 1)[:, None]
+        
+        distances = np.abs(colors[:, None, :] - centroids[None, :, :]).sum(axis=2)
+        own = distances[np.arange(len(balls)), labels]
+        distances[np.arange(len(balls)), labels] = np.inf
+        nearest_other = distances.min(axis=1) if num_groups > 1 else np.full(len(balls), np.inf)
+        
+        for ball, own_distance, other_distance in zip(balls, own.tolist(), nearest_other.tolist()):
+            if other_distance == np.inf:
+                # Single group: nothing to confuse the ball with
+                ball['separation'] = None
+                margin = 1.0
+            else:
+                separation = max(0.0, other_distance - own_distance)
+                ball['separation'] = round(separation, 1)
+                margin = min(1.0, separation / (2 * self.tolerance))
+            ball['confidence'] = round(ball.get('support', 1.0) * margin, 3)
+    
+    def clear_dendrogram(self):
+        """Forget the cached tree (e.g. when switching to another grid)"""
+        self.dendrogram = None
+        self.dendrogram_balls = None
+    
+    def regroup_balls(self, tolerance):
+        """Regroup the last grouped balls at a new tolerance (no pixel sampling)"""
+        if self.dendrogram_balls is None:
+            return {}
+        self.set_tolerance(tolerance)
+        return self.group_balls_by_color(self.dendrogram_balls)
+    
+    def score_grouping(self, labels, balls_per_tube, expected_colors):
+        """Distance of a grouping from the ideal (expected_colors groups of balls_per_tube)"""
+        sizes = Counter(labels)
+        return (abs(len(sizes) - expected_colors) * balls_per_tube +
+                sum(abs(size - balls_per_tube) for size in sizes.values()))
+    
+    def auto_tune_tolerance(self, balls_per_tube, expected_colors=None, min_tolerance=10, max_tolerance=100, step=1):
+        """Find the tolerance whose grouping has expected_colors groups of balls_per_tube balls
+
+        Only tolerances min_tolerance + k * step up to max_tolerance are
+        tried, so the result is a value the tolerance slider can show.
+        expected_colors defaults to the detected ball count divided by
+        balls_per_tube. The group count only decreases with the tolerance,
+        so the matching range is found by bisection; the tolerance returned
+        is the middle of that range. When no tolerance gives full groups,
+        the closest grouping is used. Returns (tolerance, color_groups, exact).
+        """
+        balls = self.dendrogram_balls if self.dendrogram_balls is not None else self.detected_balls
+        if not balls or balls_per_tube < 1:
+            return self.tolerance, {}, False
+        
+        dendrogram = self.get_dendrogram(balls)
+        if expected_colors is None:
+            expected_colors = max(1, len(balls) // balls_per_tube)
+        
+        candidates = list(range(min_tolerance, max_tolerance + 1, max(1, step)))
+        
+        def first_at_most(count):
+            """Index of the first candidate with at most count groups"""
+            low, high = 0, len(candidates)
+            while low < high:
+                middle = (low + high) // 2
+                if dendrogram.cluster_count(candidates[middle]) <= count:
+                    high = middle
+                else:
+                    low = middle + 1
+            return low
+        
+        best = None
+        start = first_at_most(expected_colors)
+        if start < len(candidates) and dendrogram.cluster_count(candidates[start]) == expected_colors:
+            # Every candidate until the next merge gives the same grouping
+            end = first_at_most(expected_colors - 1)
+            labels = dendrogram.cut(candidates[start])
+            if self.score_grouping(labels, balls_per_tube, expected_colors) == 0:
+                best = (candidates[(start + end - 1) // 2], True)
+        
+        if best is None:
+            scores = [(self.score_grouping(dendrogram.cut(t), balls_per_tube, expected_colors), t)
+                      for t in candidates]
+            best = (min(scores)[1], False)
+        
+        tolerance, exact = best
+        self.set_tolerance(tolerance)
+        return tolerance, self.group_balls_by_color(balls), exact
+    
+    def build_color_matrix(self, num_tubes, balls_per_tube, color_groups=None):
+        """Build the color matrix (one list per tube, top slot first) from grid positions"""
+        if color_groups is None:
+            color_groups = self.color_groups
+        
+        matrix = [[None] * balls_per_tube for _ in range(num_tubes)]
+        for color, balls in color_groups.items():
+            for ball in balls:
+                tube_idx, ball_idx = ball['grid_position']
+                if 0 <= tube_idx < num_tubes and 0 <= ball_idx < balls_per_tube:
+                    matrix[tube_idx][ball_idx] = color
+        
+        return matrix
+    
+    def build_slot_matrix(self, num_tubes, balls_per_tube, color_groups=None):
+        """Build the per-slot status matrix (one list per tube, top slot first)
+
+        Each entry is a dict with 'status', 'color_id' (index of the slot's
+        group in color_groups, None if empty) and 'confidence'. Slots that
+        were not analyzed count as empty. An empty slot below a ball cannot
+        exist in a real tube, so it is reported as uncertain.
+        """
+        if color_groups is None:
+            color_groups = self.color_groups
+        
+        color_ids = {}
+        ball_confidences = {}
+        for color_id, balls in enumerate(color_groups.values()):
+            for ball in balls:
+                color_ids[ball['grid_position']] = color_id
+                if 'confidence' in ball:
+                    ball_confidences[ball['grid_position']] = ball['confidence']
+        
+        matrix = []
+        for tube_idx in range(num_tubes):
+            tube = []
+            above_has_ball = False
+            for ball_idx in range(balls_per_tube):
+                position = (tube_idx, ball_idx)
+                slot_state = self.slot_states.get(position, {'status': 'empty', 'confidence': 0.0})
+                status, confidence = slot_state['status'], slot_state['confidence']
+                if position in ball_confidences:
+                    confidence = min(confidence, ball_confidences[position])
+                
+                if status == 'empty' and above_has_ball:
+                    status, confidence = 'uncertain', 0.0
+                above_has_ball = above_has_ball or status != 'empty'
+                
+                tube.append({
+                    'status': status,
+                    'color_id': color_ids.get(position),
+                    'confidence': confidence
+                })
+            matrix.append(tube)
+        
+        return matrix
+    
+    def count_uncertain_slots(self, slot_matrix):
+        """Number of uncertain slots in a slot matrix"""
+        return sum(1 for tube in slot_matrix for slot in tube if slot['status'] == 'uncertain')
+    
     def get_analysis_summary(self):
         """Get summary of color analysis"""
         if not self.color_groups:
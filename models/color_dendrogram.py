@@ -0,0 +1,81 @@
+"""
+Single-linkage clustering of ball colors for instant regrouping
+"""
+import numpy as np
+
+class ColorDendrogram:
+    def __init__(self, colors):
+        """Build the single-linkage tree of a list of RGB colors
+
+        The tree is stored as its minimum spanning tree edges sorted by
+        Manhattan distance; cutting it at a tolerance gives the same groups
+        as linking every pair of colors closer than the tolerance.
+        """
+        self.colors = np.asarray(colors, dtype=np.int32).reshape(-1, 3)
+        self.size = len(self.colors)
+        self.edges, self.heights = self.build_spanning_tree(self.colors)
+
+    def build_spanning_tree(self, colors):
+        """Prim's algorithm on the dense distance matrix, O(n^2) vectorized"""
+        n = len(colors)
+        if n < 2:
+            return np.zeros((0, 2), dtype=np.intp), np.zeros(0, dtype=np.int32)
+
+        in_tree = np.zeros(n, dtype=bool)
+        in_tree[0] = True
+        best = np.abs(colors - colors[0]).sum(axis=1)
+        best[0] = np.iinfo(np.int32).max
+        parent = np.zeros(n, dtype=np.intp)
+
+        edges = np.zeros((n - 1, 2), dtype=np.intp)
+        heights = np.zeros(n - 1, dtype=np.int32)
+        for k in range(n - 1):
+            nearest = int(np.argmin(best))
+            edges[k] = (parent[nearest], nearest)
+            heights[k] = best[nearest]
+            in_tree[nearest] = True
+            best[nearest] = np.iinfo(np.int32).max
+
+            distances = np.abs(colors - colors[nearest]).sum(axis=1)
+            closer = (distances < best) & ~in_tree
+            best[closer] = distances[closer]
+            parent[closer] = nearest
+
+        order = np.argsort(heights, kind='stable')
+        return edges[order], heights[order]
+
+    def count_merges(self, tolerance):
+        """Number of tree edges strictly below the tolerance"""
+        return int(np.searchsorted(self.heights, tolerance, side='left'))
+
+    def cluster_count(self, tolerance):
+        """Number of groups at a tolerance (O(log n))"""
+        return self.size - self.count_merges(tolerance)
+
+    def get_thresholds(self):
+        """Distinct tolerances at which the grouping changes"""
+        return np.unique(self.heights + 1)
+
+    def cut(self, tolerance):
+        """Get a group label per color (labels numbered by first appearance)"""
+        parents = list(range(self.size))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for a, b in self.edges[:self.count_merges(tolerance)].tolist():
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+
+        labels = []
+        label_of_root = {}
+        for i in range(self.size):
+            root = find(i)
+            if root not in label_of_root:
+                label_of_root[root] = len(label_of_root)
+            labels.append(label_of_root[root])
+        return labels
@@ -0,0 +1,72 @@
+"""
+Color naming with precomputed lookup tables
+"""
+import numpy as np
+
+# (red range, green range, blue range, name), first match wins
+COLOR_RANGES = [
+    ((200, 255), (0, 50), (0, 50), "Rouge"),
+    ((0, 50), (200, 255), (0, 50), "Vert"),
+    ((0, 50), (0, 50), (200, 255), "Bleu"),
+    ((200, 255), (200, 255), (0, 100), "Jaune"),
+    ((200, 255), (0, 100), (200, 255), "Magenta"),
+    ((0, 100), (200, 255), (200, 255), "Cyan"),
+    ((200, 255), (100, 200), (0, 100), "Orange"),
+    ((100, 200), (0, 100), (200, 255), "Violet"),
+    ((100, 200), (50, 150), (0, 100), "Marron"),
+    ((180, 255), (180, 255), (180, 255), "Blanc"),
+    ((0, 80), (0, 80), (0, 80), "Noir"),
+    ((100, 180), (100, 180), (100, 180), "Gris"),
+]
+
+COLOR_NAMES = [name for _, _, _, name in COLOR_RANGES]
+
+def build_channel_masks(ranges):
+    """Build one 256-entry bitmask table per channel
+
+    Bit i of masks[channel][value] is set when value lies in the channel
+    range of entry i; a color matches entry i when bit i is set for all
+    three channels.
+    """
+    masks = np.zeros((3, 256), dtype=np.uint16)
+    values = np.arange(256)
+    for bit, entry in enumerate(ranges):
+        for channel in range(3):
+            low, high = entry[channel]
+            masks[channel, (values >= low) & (values <= high)] |= 1 << bit
+    return masks
+
+def build_first_bit_table(num_bits):
+    """Map every bitmask to the index of its lowest set bit (-1 for 0)"""
+    table = np.full(1 << num_bits, -1, dtype=np.int8)
+    for bit in reversed(range(num_bits)):
+        table[np.arange(1 << num_bits) & (1 << bit) != 0] = bit
+    return table
+
+# Built once per process (a few KB)
+CHANNEL_MASKS = build_channel_masks(COLOR_RANGES)
+FIRST_MATCH = build_first_bit_table(len(COLOR_RANGES))
+
+def name_indices(colors):
+    """Get the COLOR_NAMES index of each color of an (N, 3) array (-1 if none)"""
+    colors = np.asarray(colors).reshape(-1, 3)
+    in_range = ((colors >= 0) & (colors <= 255)).all(axis=1)
+    channels = np.clip(colors, 0, 255).astype(np.intp)
+    matches = (CHANNEL_MASKS[0][channels[:, 0]] &
+               CHANNEL_MASKS[1][channels[:, 1]] &
+               CHANNEL_MASKS[2][channels[:, 2]])
+    # Values outside 0-255 match no range
+    matches[~in_range] = 0
+    return FIRST_MATCH[matches]
+
+def get_color_names(colors):
+    """Get human-readable names for a list or array of RGB colors"""
+    colors = np.asarray(colors).reshape(-1, 3)
+    names = []
+    for (r, g, b), index in zip(colors.tolist(), name_indices(colors).tolist()):
+        names.append(COLOR_NAMES[index] if index >= 0 else f"Couleur ({r},{g},{b})")
+    return names
+
+def get_color_name(rgb_color):
+    """Get human-readable name for one RGB color"""
+    return get_color_names([rgb_color[:3]])[0]
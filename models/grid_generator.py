@@ -2,6 +2,7 @@
 Grid generation for ball detection
 """
 import math
+from instrumentation import timed
 
 class GridGenerator:
     def __init__(self):
@@ -55,6 +56,7 @@ class GridGenerator:
         """Get current tube parameters"""
         return self.num_tubes, self.balls_per_tube
     
+    @timed('GridGenerator.generate_grid')
     def generate_grid(self):
         """Generate grid of circles from corner points using tube parameters"""
         if len(self.corner_points) != 4:
@@ -115,6 +117,20 @@ class GridGenerator:
         
         return grid_circles
     
+    def scale_circles(self, circles, scale):
+        """Scale circle positions and radius (e.g. from a downsampled image to full resolution)"""
+        if scale == 1.0:
+            return circles
+        
+        scaled = []
+        for circle in circles:
+            scaled_circle = dict(circle)
+            scaled_circle['x'] = int(circle['x'] * scale)
+            scaled_circle['y'] = int(circle['y'] * scale)
+            scaled_circle['radius'] = max(1, int(circle['radius'] * scale))
+            scaled.append(scaled_circle)
+        return scaled
+    
     def get_expected_ball_count(self):
         """Get expected total number of balls"""
         return self.total_expected_balls
@@ -125,4 +141,15 @@ class GridGenerator:
     
     def is_ready(self):
         """Check if grid is ready to be generated"""
-        return len(self.corner_points) == 4
\ No newline at end of file
+        return len(self.corner_points) == 4
+
+def build_grid_matrix(grid, num_tubes, balls_per_tube):
+    """Rebuild the grid matrix (tube x ball -> circle position) from a grid"""
+    matrix = [[None] * balls_per_tube for _ in range(num_tubes)]
+    for circle in grid:
+        tube_idx, ball_idx = circle.get('tube_idx'), circle.get('ball_idx')
+        if tube_idx is None or ball_idx is None:
+            continue
+        if 0 <= tube_idx < num_tubes and 0 <= ball_idx < balls_per_tube:
+            matrix[tube_idx][ball_idx] = {'x': circle['x'], 'y': circle['y'], 'radius': circle['radius']}
+    return matrix
@@ -2,23 +2,302 @@
 Image processing utilities for Ball Sort Puzzle Solver
 """
 from PIL import Image, ImageTk, ImageDraw
+import numpy as np
+import json
 import math
+import os
+import threading
+from instrumentation import timed
+
+try:
+    import cv2
+except ImportError:  # cv2 decoder backend unavailable
+    cv2 = None
+
+# Channel selection (as views) for supported raw frame layouts
+RAW_CHANNEL_ORDERS = {
+    'RGB': (3, slice(None)),
+    'BGR': (3, slice(None, None, -1)),
+    'RGBA': (4, slice(0, 3)),
+    'BGRA': (4, slice(2, None, -1)),
+}
+
+# 'pil': full decode; 'pil-draft': JPEG draft mode when reducing;
+# 'cv2': cv2.imdecode, with IMREAD_REDUCED_COLOR_2/4/8 when reducing
+DECODER_BACKENDS = ('pil', 'pil-draft', 'cv2')
 
 class ImageProcessor:
     def __init__(self):
-        self.original_image = None
-        self.processed_image = None
+        self._original_image = None
+        self._processed_image = None
         self.scale_factor = 1.0
+        
+        # Raw frame input: H x W x 3 view over a memory-mapped file
+        self.source_array = None
+        self.processed_array = None
+        
+        # Downsampled analysis mode
+        self.image_path = None
+        self.max_analysis_size = None
+        self.load_scale = 1.0
+        self.crop_box = None
+        self.full_resolution_array = None
+        self.full_resolution_lock = threading.Lock()
+        self.source_size = None
+        self.decoder_backend = 'pil-draft'
+    
+    @property
+    def original_image(self):
+        """Full working image as PIL (materialized on demand from the source array)"""
+        if self._original_image is None and self.source_array is not None:
+            self._original_image = Image.fromarray(np.ascontiguousarray(self.source_array))
+        return self._original_image
+    
+    @original_image.setter
+    def original_image(self, image):
+        self._original_image = image
     
+    @property
+    def processed_image(self):
+        """Current crop as PIL (materialized on demand from the crop view)"""
+        if self._processed_image is None and self.processed_array is not None:
+            if self.crop_box is None:
+                # No crop yet: share the full image instead of a second copy
+                return self.original_image
+            self._processed_image = Image.fromarray(np.ascontiguousarray(self.processed_array))
+        return self._processed_image
+    
+    @processed_image.setter
+    def processed_image(self, image):
+        self._processed_image = image
+    
+    def get_analysis_image(self):
+        """Get the image to analyze: array view of the crop when available"""
+        if self.processed_array is not None:
+            return self.processed_array
+        return self.processed_image
+    
+    def get_crop_view(self, crop_box):
+        """Get a zero-copy array view of the source for a crop box"""
+        if self.source_array is None or crop_box is None:
+            return self.source_array
+        left, top, right, bottom = crop_box
+        return self.source_array[top:bottom, left:right]
+    
+    def get_crop_image(self, crop_box):
+        """Materialize a crop box of the source as a PIL image"""
+        view = self.get_crop_view(crop_box)
+        if view is None:
+            return None
+        return Image.fromarray(np.ascontiguousarray(view))
+    
+    def set_decoder_backend(self, backend):
+        """Set the decoder used by load_image (see DECODER_BACKENDS)"""
+        if backend not in DECODER_BACKENDS:
+            raise ValueError(f"Décodeur inconnu: {backend}")
+        if backend == 'cv2' and cv2 is None:
+            raise ValueError("Le décodeur cv2 nécessite OpenCV")
+        self.decoder_backend = backend
+    
+    def set_max_analysis_size(self, max_size):
+        """Set max image side for analysis (None keeps full resolution)"""
+        self.max_analysis_size = max(100, int(max_size)) if max_size else None
+    
+    @timed('ImageProcessor.load_image')
     def load_image(self, image_path):
-        """Load image from file path"""
-        self.original_image = Image.open(image_path).convert('RGB')
-        self.processed_image = self.original_image.copy()
+        """Load image from file path
+
+        The decoded pixels are kept in a single array; crops are views of it
+        and PIL images are only built when the GUI asks for them. The file
+        (path or binary file object) is decoded with the decoder backend.
+        """
+        # Opening only reads the header: the full size is known before decoding
+        with Image.open(image_path) as image:
+            full_width = image.size[0]
+            self.source_size = image.size
+            max_size = self.max_analysis_size if self.max_analysis_size and max(image.size) > self.max_analysis_size else None
+            
+            if self.decoder_backend == 'cv2':
+                if hasattr(image_path, 'seek'):
+                    image_path.seek(0)
+                source_array = self.decode_cv2(image_path, image.size, max_size)
+            elif max_size:
+                source_array = np.asarray(self.decode_reduced(image, max_size, self.decoder_backend == 'pil-draft'))
+            else:
+                # RGB files need no conversion copy
+                source_array = np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+        
+        self.image_path = image_path
+        self.load_scale = source_array.shape[1] / full_width
+        self.crop_box = None
+        self.full_resolution_array = None
+        
+        self.source_array = source_array
+        self.processed_array = self.source_array
+        self._original_image = None
+        self._processed_image = None
         return self.original_image
     
+    @timed('ImageProcessor.load_raw_frame')
+    def load_raw_frame(self, frame_path, width=None, height=None, stride=None,
+                       channel_order='RGB', offset=0):
+        """Memory-map a raw frame (or .npy array) without decoding or copying it
+
+        Raw files need width and height; stride is the row size in bytes
+        (defaults to width * channels). The frame is exposed as an H x W x 3
+        RGB view of the mapped buffer.
+        """
+        if channel_order not in RAW_CHANNEL_ORDERS:
+            raise ValueError(f"Ordre de canaux non supporté: {channel_order}")
+        channels, channel_slice = RAW_CHANNEL_ORDERS[channel_order]
+        
+        if frame_path.lower().endswith('.npy'):
+            frame = np.load(frame_path, mmap_mode='r')
+            if frame.ndim != 3 or frame.shape[2] != channels:
+                raise ValueError(f"Forme de tableau inattendue: {frame.shape}")
+        else:
+            if not width or not height:
+                raise ValueError("Largeur et hauteur requises pour une image brute")
+            row_bytes = width * channels
+            stride = stride or row_bytes
+            if stride < row_bytes:
+                raise ValueError("Le pas de ligne est plus petit que la largeur")
+            
+            rows = np.memmap(frame_path, dtype=np.uint8, mode='r', offset=offset,
+                             shape=(height, stride))
+            # Dropping the row padding and splitting pixels are both views
+            frame = rows[:, :row_bytes].reshape(height, width, channels)
+        
+        self.source_array = frame[:, :, channel_slice]
+        self.processed_array = self.source_array
+        self.source_size = (frame.shape[1], frame.shape[0])
+        self.image_path = frame_path
+        self.load_scale = 1.0
+        self.crop_box = None
+        self.full_resolution_array = None
+        self._original_image = None
+        self._processed_image = None
+        return self.source_array
+    
+    def load_frame_file(self, frame_path):
+        """Load a raw frame using its JSON metadata sidecar (<frame>.json)
+
+        The sidecar holds width, height and optionally stride, channel_order
+        and offset. .npy files need no metadata.
+        """
+        metadata = {}
+        metadata_path = frame_path + '.json'
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+        
+        return self.load_raw_frame(
+            frame_path,
+            width=metadata.get('width'),
+            height=metadata.get('height'),
+            stride=metadata.get('stride'),
+            channel_order=metadata.get('channel_order', 'RGB'),
+            offset=metadata.get('offset', 0)
+        )
+    
+    def decode_reduced(self, image, max_size, draft=True):
+        """Decode an image at reduced size (JPEG draft mode, then integer reduce)"""
+        width, height = image.size
+        scale = max_size / max(width, height)
+        
+        # JPEG can decode directly at 1/2, 1/4 or 1/8 scale
+        if draft and image.format == 'JPEG':
+            image.draft('RGB', (int(width * scale), int(height * scale)))
+        
+        image = image.convert('RGB')
+        
+        factor = int(max(image.size) / max_size)
+        if factor > 1:
+            image = image.reduce(factor)
+        return image
+    
+    def decode_cv2(self, image_path, full_size, max_size=None):
+        """Decode with OpenCV as an RGB view, reduced by 2, 4 or 8 while decoding if possible
+
+        EXIF orientation is ignored, as with PIL, so sizes, crop boxes and
+        profiles are the same for every backend.
+        """
+        flag = cv2.IMREAD_COLOR
+        if max_size:
+            ratio = max(full_size) / max_size
+            for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                if ratio >= factor:
+                    flag = reduced_flag
+                    break
+        
+        if hasattr(image_path, 'read'):
+            data = np.frombuffer(image_path.read(), dtype=np.uint8)
+        else:
+            data = np.fromfile(image_path, dtype=np.uint8)
+        bgr = cv2.imdecode(data, flag | cv2.IMREAD_IGNORE_ORIENTATION)
+        if bgr is None:
+            raise ValueError("Impossible de décoder l'image")
+        
+        if max_size:
+            factor = int(max(bgr.shape[:2]) / max_size)
+            if factor > 1:
+                bgr = cv2.resize(bgr, (bgr.shape[1] // factor, bgr.shape[0] // factor),
+                                 interpolation=cv2.INTER_AREA)
+        # Channel reversal is a view, no conversion copy
+        return bgr[:, :, ::-1]
+    
+    def decode_full_resolution(self):
+        """Decode the source file at full resolution with the decoder backend"""
+        if hasattr(self.image_path, 'seek'):
+            self.image_path.seek(0)
+        if self.decoder_backend == 'cv2':
+            return self.decode_cv2(self.image_path, self.source_size)
+        with Image.open(self.image_path) as image:
+            return np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+    
+    def get_source_size(self):
+        """Get (width, height) of the source file before any downsampling"""
+        return self.source_size
+    
+    def is_downsampled(self):
+        """Check if the working image is smaller than the source file"""
+        return self.load_scale < 1.0
+    
+    def get_full_resolution_crop(self):
+        """Get current crop at full resolution and its scale from working coordinates
+
+        The full resolution source is decoded lazily, only when a caller
+        needs it, and the crop is a view of it.
+        """
+        if not self.is_downsampled() or not self.image_path:
+            return self.get_analysis_image(), 1.0
+        return self.get_full_resolution_view(self.crop_box)
+    
+    def get_full_resolution_view(self, crop_box):
+        """Get a crop box (working coordinates) of the full resolution source and its scale
+
+        Safe to call from worker threads: the source is decoded once.
+        """
+        if not self.is_downsampled() or not self.image_path:
+            return self.get_crop_view(crop_box), 1.0
+        
+        with self.full_resolution_lock:
+            if self.full_resolution_array is None:
+                self.full_resolution_array = self.decode_full_resolution()
+        
+        scale = 1.0 / self.load_scale
+        if not crop_box:
+            return self.full_resolution_array, scale
+        
+        left, top, right, bottom = crop_box
+        return self.full_resolution_array[int(top * scale):int(bottom * scale),
+                                          int(left * scale):int(right * scale)], scale
+    
+    @timed('ImageProcessor.crop_image')
     def crop_image(self, x1, y1, x2, y2):
-        """Crop image to specified rectangle"""
-        if not self.original_image:
+        """Crop image to specified rectangle (returns a view of the source array)"""
+        if self.source_array is None:
             return None
         
         # Ensure coordinates are in correct order
@@ -27,9 +306,15 @@ class ImageProcessor:
         right = max(x1, x2)
         bottom = max(y1, y2)
         
-        self.processed_image = self.original_image.crop((left, top, right, bottom))
-        return self.processed_image
+        # Zero-copy slice of the source, PIL image built on demand; the full
+        # size PIL copy made for the crop tool is released
+        self.crop_box = (left, top, right, bottom)
+        self.processed_array = self.get_crop_view(self.crop_box)
+        self._processed_image = None
+        self._original_image = None
+        return self.processed_array
     
+    @timed('ImageProcessor.resize_for_display')
     def resize_for_display(self, max_width=500, max_height=400):
         """Resize image for display while maintaining aspect ratio"""
         if not self.processed_image:
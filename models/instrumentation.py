@@ -0,0 +1,123 @@
+"""
+Lightweight timing instrumentation for the analysis pipeline
+"""
+from collections import deque
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+class Instrumentation:
+    def __init__(self, max_spans=1000):
+        self.enabled = True
+        self.spans = deque(maxlen=max_spans)
+        self.stats = {}
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name):
+        """Time a block of code: with instrumentation.span('name'): ..."""
+        if not self.enabled:
+            yield
+            return
+
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self._local.depth = depth
+            self.record(name, duration, depth)
+
+    def timed(self, name=None):
+        """Decorator timing every call of a function"""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, duration, depth=0):
+        """Record a finished span and notify listeners"""
+        span = {
+            'name': name,
+            'duration_ms': round(duration * 1000, 3),
+            'depth': depth,
+            'timestamp': time.time()
+        }
+
+        with self._lock:
+            self.spans.append(span)
+            stats = self.stats.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['count'] += 1
+            stats['total_ms'] += span['duration_ms']
+            stats['max_ms'] = max(stats['max_ms'], span['duration_ms'])
+            listeners = list(self.listeners)
+
+        for listener in listeners:
+            listener(span)
+
+    def add_listener(self, callback):
+        """Register a callback receiving each finished span"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregister a span callback"""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def get_stats(self):
+        """Get per-span statistics (count, total, mean, max in ms)"""
+        with self._lock:
+            result = {}
+            for name, stats in self.stats.items():
+                result[name] = dict(stats)
+                result[name]['mean_ms'] = round(stats['total_ms'] / stats['count'], 3)
+                result[name]['total_ms'] = round(stats['total_ms'], 3)
+            return result
+
+    def get_summary_lines(self):
+        """Get human-readable summary lines sorted by total time"""
+        stats = self.get_stats()
+        lines = []
+        for name, data in sorted(stats.items(), key=lambda item: item[1]['total_ms'], reverse=True):
+            lines.append(f"{name}: {data['count']}x, moy. {data['mean_ms']:.1f} ms, "
+                         f"max {data['max_ms']:.1f} ms")
+        return lines
+
+    def to_json(self):
+        """Serialize spans and statistics to a JSON string"""
+        with self._lock:
+            spans = list(self.spans)
+        return json.dumps({'stats': self.get_stats(), 'spans': spans}, indent=2)
+
+    def export_json(self, path):
+        """Write spans and statistics to a JSON file"""
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+    def reset(self):
+        """Clear recorded spans and statistics"""
+        with self._lock:
+            self.spans.clear()
+            self.stats = {}
+
+# Shared instance used by the pipeline modules
+instrumentation = Instrumentation()
+
+def timed(name=None):
+    """Decorator timing a function with the shared instrumentation"""
+    return instrumentation.timed(name)
+
+def span(name):
+    """Context manager timing a block with the shared instrumentation"""
+    return instrumentation.span(name)
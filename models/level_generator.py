@@ -0,0 +1,96 @@
+"""
+Seeded random level generation for solver benchmarks
+"""
+import random
+
+# Distinct RGB colors used to build synthetic levels (up to 20 colors)
+DEFAULT_PALETTE = [
+    (220, 40, 40),    # Rouge
+    (40, 200, 60),    # Vert
+    (40, 80, 220),    # Bleu
+    (230, 220, 40),   # Jaune
+    (220, 60, 220),   # Magenta
+    (60, 210, 220),   # Cyan
+    (240, 150, 40),   # Orange
+    (140, 60, 220),   # Violet
+    (140, 90, 40),    # Marron
+    (245, 245, 245),  # Blanc
+    (120, 120, 120),  # Gris
+    (250, 160, 190),  # Rose
+    (30, 110, 60),    # Vert foncé
+    (20, 30, 120),    # Bleu marine
+    (170, 220, 90),   # Vert clair
+    (120, 20, 40),    # Bordeaux
+    (100, 180, 250),  # Bleu ciel
+    (200, 170, 120),  # Beige
+    (90, 60, 110),    # Prune
+    (40, 40, 40),     # Noir
+]
+
+class LevelGenerator:
+    def __init__(self, seed=None, palette=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.palette = list(palette) if palette else list(DEFAULT_PALETTE)
+
+    def reseed(self, seed):
+        """Reset the random generator with a new seed"""
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def generate_level(self, num_colors, balls_per_tube=4, empty_tubes=2):
+        """Generate a shuffled color matrix (tubes x balls_per_tube)
+
+        The layout matches ColorAnalyzer.build_color_matrix: one list per tube, index 0 is
+        the top slot, and empty slots/tubes are None.
+        """
+        if num_colors < 1 or num_colors > len(self.palette):
+            raise ValueError(f"num_colors doit être entre 1 et {len(self.palette)}")
+
+        balls_per_tube = max(1, balls_per_tube)
+        balls = []
+        for color in self.palette[:num_colors]:
+            balls.extend([color] * balls_per_tube)
+
+        # Reshuffle a few times to avoid handing out an already solved level
+        for _ in range(10):
+            self.random.shuffle(balls)
+            if num_colors == 1 or not self._is_sorted(balls, balls_per_tube):
+                break
+
+        matrix = []
+        for tube_idx in range(num_colors):
+            start = tube_idx * balls_per_tube
+            matrix.append(balls[start:start + balls_per_tube])
+
+        for _ in range(max(0, empty_tubes)):
+            matrix.append([None] * balls_per_tube)
+
+        return matrix
+
+    def generate_corpus(self, color_counts, levels_per_size=5, balls_per_tube=4, empty_tubes=2):
+        """Generate a list of levels for each color count"""
+        corpus = []
+        for num_colors in color_counts:
+            for level_idx in range(levels_per_size):
+                corpus.append({
+                    'level_id': f"c{num_colors:02d}_{level_idx:03d}",
+                    'num_colors': num_colors,
+                    'balls_per_tube': balls_per_tube,
+                    'empty_tubes': empty_tubes,
+                    'color_matrix': self.generate_level(num_colors, balls_per_tube, empty_tubes)
+                })
+        return corpus
+
+    def difficulty_sweep(self, max_colors=20, min_colors=2, levels_per_size=5, balls_per_tube=4, empty_tubes=2):
+        """Generate a corpus with increasing number of colors (up to 20)"""
+        max_colors = min(max_colors, len(self.palette))
+        return self.generate_corpus(range(min_colors, max_colors + 1), levels_per_size,
+                                    balls_per_tube, empty_tubes)
+
+    def _is_sorted(self, balls, balls_per_tube):
+        """Check if every tube of a flat ball list holds a single color"""
+        for start in range(0, len(balls), balls_per_tube):
+            if len(set(balls[start:start + balls_per_tube])) > 1:
+                return False
+        return True
@@ -0,0 +1,233 @@
+"""
+Solver-ready export of color matrices (JSON, binary, one-line text, JSON lines)
+
+A board is a palette plus one entry per row: its tube capacity and its
+tubes. Tubes are stacks of color ids from bottom to top (empty slots
+dropped, so an empty tube is []). Color ids start at 1; id i is
+palette[i - 1].
+"""
+import json
+import struct
+import numpy as np
+
+FORMAT_NAME = "ballsort-board"
+FORMAT_VERSION = 1
+
+BINARY_MAGIC = b'BSB1'
+TEXT_DIGITS = "123456789abcdefghijklmnopqrstuvwxyz"
+
+def build_board(color_matrices, capacities=None, color_ids=None, palette=None):
+    """Build a board from color matrices (matrix[tube][slot], top slot first)
+
+    capacities defaults to the matrix slot count of each row. color_ids
+    (RGB tuple -> id) and palette can be given to share ids between rows
+    whose group colors differ slightly; otherwise every distinct RGB value
+    gets its own id.
+    """
+    color_ids = dict(color_ids) if color_ids else {}
+    palette = [tuple(color) for color in palette] if palette else []
+
+    rows = []
+    for row_idx, matrix in enumerate(color_matrices):
+        tubes = []
+        for tube in matrix:
+            stack = []
+            for color in reversed(tube):
+                if color is None:
+                    continue
+                color = tuple(color)
+                if color not in color_ids:
+                    palette.append(color)
+                    color_ids[color] = len(palette)
+                stack.append(color_ids[color])
+            tubes.append(stack)
+
+        if capacities:
+            capacity = capacities[row_idx]
+        else:
+            capacity = max((len(tube) for tube in matrix), default=0)
+        rows.append({'capacity': capacity, 'tubes': tubes})
+
+    return {'palette': palette, 'rows': rows}
+
+def board_from_manager(multi_row_manager):
+    """Build a board from the completed rows of a MultiRowManager
+
+    Colors are identified by their combined (cross-row) group, so the same
+    ball color gets the same id in every row.
+    """
+    results = multi_row_manager.get_aggregated_results()
+    color_ids = {(record.row_index, record.rgb): record.color_id + 1 for record in results.row_colors}
+    palette = [combined.rgb for combined in results.combined_colors]
+
+    board = {'palette': palette, 'rows': []}
+    for row_idx, row_data in sorted(multi_row_manager.rows_data.items()):
+        if not row_data['completed']:
+            continue
+        row_color_ids = {rgb: color_id for (index, rgb), color_id in color_ids.items() if index == row_idx}
+        row_board = build_board([row_data['color_matrix']], [row_data['balls_per_tube']],
+                                row_color_ids, board['palette'])
+        board['palette'] = row_board['palette']
+        board['rows'].extend(row_board['rows'])
+    return board
+
+def board_to_json(board):
+    """Serialize a board to a JSON-friendly dict"""
+    return {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'palette': [list(color) for color in board['palette']],
+        'rows': board['rows']
+    }
+
+def write_json(board, path):
+    """Write a board as JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(board_to_json(board), f, separators=(',', ':'))
+
+def read_json(path):
+    """Read a board written by write_json"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != FORMAT_NAME:
+        raise ValueError("Format de plateau inconnu")
+    return {'palette': [tuple(color) for color in data['palette']], 'rows': data['rows']}
+
+def board_to_bytes(board):
+    """Pack a board into compact binary
+
+    Layout (little endian): magic 'BSB1', u16 palette size, u16 row count,
+    palette as u8 RGB triplets, then per row: u16 tube count, u8 capacity
+    and a tubes x capacity u8 block of ids (bottom first, 0 = empty).
+    """
+    palette = board['palette']
+    if len(palette) > 255:
+        raise ValueError("Trop de couleurs pour le format binaire (max 255)")
+
+    parts = [BINARY_MAGIC, struct.pack('<HH', len(palette), len(board['rows'])),
+             np.array(palette, dtype=np.uint8).reshape(-1, 3).tobytes()]
+    for row in board['rows']:
+        capacity = row['capacity']
+        slots = np.zeros((len(row['tubes']), capacity), dtype=np.uint8)
+        for tube_idx, tube in enumerate(row['tubes']):
+            slots[tube_idx, :len(tube)] = tube[:capacity]
+        parts.append(struct.pack('<HB', len(row['tubes']), capacity))
+        parts.append(slots.tobytes())
+    return b''.join(parts)
+
+def board_from_bytes(data):
+    """Unpack a board packed by board_to_bytes"""
+    if data[:4] != BINARY_MAGIC:
+        raise ValueError("Format de plateau binaire inconnu")
+    num_colors, num_rows = struct.unpack_from('<HH', data, 4)
+    offset = 8
+
+    palette = [tuple(color) for color in
+               np.frombuffer(data, dtype=np.uint8, count=num_colors * 3, offset=offset).reshape(-1, 3).tolist()]
+    offset += num_colors * 3
+
+    rows = []
+    for _ in range(num_rows):
+        num_tubes, capacity = struct.unpack_from('<HB', data, offset)
+        offset += 3
+        slots = np.frombuffer(data, dtype=np.uint8, count=num_tubes * capacity, offset=offset)
+        offset += num_tubes * capacity
+        tubes = [[color_id for color_id in tube if color_id] for tube in slots.reshape(num_tubes, capacity).tolist()]
+        rows.append({'capacity': capacity, 'tubes': tubes})
+    return {'palette': palette, 'rows': rows}
+
+def write_binary(board, path):
+    """Write a board as compact binary"""
+    with open(path, 'wb') as f:
+        f.write(board_to_bytes(board))
+
+def read_binary(path):
+    """Read a board written by write_binary"""
+    with open(path, 'rb') as f:
+        return board_from_bytes(f.read())
+
+def board_to_text(board):
+    """One-line notation: rows separated by '/', each 'capacity:tube,tube,...'
+
+    Each tube is one character per ball, bottom first (1-9 then a-z for
+    ids 10-35); an empty tube is an empty string. A row without tubes is
+    'capacity:' (so a row holding one single empty tube cannot be written).
+    The palette is not part of the notation.
+    """
+    if len(board['palette']) > len(TEXT_DIGITS):
+        raise ValueError(f"Trop de couleurs pour la notation texte (max {len(TEXT_DIGITS)})")
+    rows = []
+    for row in board['rows']:
+        tubes = ",".join("".join(TEXT_DIGITS[color_id - 1] for color_id in tube) for tube in row['tubes'])
+        rows.append(f"{row['capacity']}:{tubes}")
+    return "/".join(rows)
+
+def board_from_text(text, palette=None):
+    """Parse the one-line notation (palette is optional)"""
+    rows = []
+    for row_text in text.strip().split("/"):
+        capacity, _, tubes_text = row_text.partition(":")
+        # "".split(",") is [""]: an empty list of tubes is a row without tubes
+        tubes = ([[TEXT_DIGITS.index(char) + 1 for char in tube] for tube in tubes_text.split(",")]
+                 if tubes_text else [])
+        rows.append({'capacity': int(capacity), 'tubes': tubes})
+    return {'palette': [tuple(color) for color in palette] if palette else [], 'rows': rows}
+
+def write_text(board, path):
+    """Write a board as one line of text"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(board_to_text(board) + "\n")
+
+class JsonLinesWriter:
+    """Streaming writer: one compact JSON board per line"""
+
+    def __init__(self, path_or_file):
+        if hasattr(path_or_file, 'write'):
+            self.file = path_or_file
+            self.owns_file = False
+        else:
+            self.file = open(path_or_file, 'w', encoding='utf-8')
+            self.owns_file = True
+        self.count = 0
+
+    def write(self, board, **metadata):
+        """Write one board (extra metadata such as a level id is merged in)"""
+        record = board_to_json(board)
+        record.update(metadata)
+        self.file.write(json.dumps(record, separators=(',', ':')))
+        self.file.write("\n")
+        self.count += 1
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def iter_json_lines(path):
+    """Read boards back from a JSON-lines file, one at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                record['palette'] = [tuple(color) for color in record['palette']]
+                yield record
+
+def write_board(board, path):
+    """Write a board in the format given by the file extension (.json, .bsb, .txt, .jsonl)"""
+    lower_path = path.lower()
+    if lower_path.endswith('.jsonl'):
+        with JsonLinesWriter(path) as writer:
+            writer.write(board)
+    elif lower_path.endswith('.json'):
+        write_json(board, path)
+    elif lower_path.endswith('.txt'):
+        write_text(board, path)
+    else:
+        write_binary(board, path)
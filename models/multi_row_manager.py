@@ -1,6 +1,10 @@
 """
 Multi-row manager for handling multiple rows of test tubes
 """
+from types import MappingProxyType
+from instrumentation import timed
+from color_names import get_color_name
+from aggregated_results import AggregatedResults, RowColorRecord, CombinedColor
 
 class MultiRowManager:
     def __init__(self):
@@ -9,6 +13,13 @@ class MultiRowManager:
         self.rows_data = {}
         self.is_multi_row_mode = False
         
+        # Memoized aggregation: group state after each row, rows to re-merge
+        self.group_snapshots = {}
+        self.group_tolerance = 40
+        self.row_group_ids = {}
+        self.dirty_rows = set()
+        self.aggregated_results = None
+        
     def set_num_rows(self, num_rows):
         """Set total number of rows"""
         self.num_rows = max(1, num_rows)
@@ -20,16 +31,19 @@ class MultiRowManager:
         for i in range(self.num_rows):
             self.rows_data[i] = {
                 'corners': [],
+                'radius': 15,
                 'num_tubes': 5,
                 'balls_per_tube': 4,
                 'grid': [],
                 'colors': {},
                 'completed': False,
-                'cropped_image': None,
-                'processed_image': None,
+                'crop_box': None,
+                'auto_crop': False,
                 'grid_matrix': [],
-                'color_matrix': []
+                'color_matrix': [],
+                'slot_matrix': []
             }
+        self.invalidate_aggregation()
     
     def get_current_row_data(self):
         """Get data for current row"""
@@ -42,11 +56,17 @@ class MultiRowManager:
         if self.current_row in self.rows_data:
             self.rows_data[self.current_row]['corners'] = corners
     
+    def set_current_row_radius(self, radius):
+        """Set ball radius for current row"""
+        if self.current_row in self.rows_data:
+            self.rows_data[self.current_row]['radius'] = radius
+    
     def set_current_row_tube_params(self, num_tubes, balls_per_tube):
         """Set tube parameters for current row"""
         if self.current_row in self.rows_data:
             self.rows_data[self.current_row]['num_tubes'] = num_tubes
             self.rows_data[self.current_row]['balls_per_tube'] = balls_per_tube
+            self.aggregated_results = None
     
     def set_current_row_grid(self, grid):
         """Set grid for current row"""
@@ -58,18 +78,37 @@ class MultiRowManager:
         if self.current_row in self.rows_data:
             self.rows_data[self.current_row]['colors'] = colors
             self.rows_data[self.current_row]['completed'] = True
+            self.mark_row_dirty(self.current_row)
     
-    def set_current_row_images(self, cropped_image, processed_image):
-        """Set cropped and processed images for current row"""
+    def set_current_row_crop_box(self, crop_box, auto=False):
+        """Set crop box for current row (images are not copied, see ImageProcessor.get_crop_view)
+
+        auto marks boxes proposed by BoardDetector, which a new automatic
+        crop may replace; manual boxes are kept.
+        """
         if self.current_row in self.rows_data:
-            self.rows_data[self.current_row]['cropped_image'] = cropped_image
-            self.rows_data[self.current_row]['processed_image'] = processed_image
+            self.rows_data[self.current_row]['crop_box'] = crop_box
+            self.rows_data[self.current_row]['auto_crop'] = auto
     
-    def set_current_row_matrices(self, grid_matrix, color_matrix):
-        """Set grid and color matrices for current row"""
+    def clear_current_row_calibration(self):
+        """Forget corners, grid and analysis of current row (e.g. after its crop changed)"""
+        if self.current_row in self.rows_data:
+            row_data = self.rows_data[self.current_row]
+            row_data['corners'] = []
+            row_data['grid'] = []
+            row_data['colors'] = {}
+            row_data['completed'] = False
+            row_data['grid_matrix'] = []
+            row_data['color_matrix'] = []
+            row_data['slot_matrix'] = []
+            self.mark_row_dirty(self.current_row)
+    
+    def set_current_row_matrices(self, grid_matrix, color_matrix, slot_matrix=None):
+        """Set grid, color and slot status matrices for current row"""
         if self.current_row in self.rows_data:
             self.rows_data[self.current_row]['grid_matrix'] = grid_matrix
             self.rows_data[self.current_row]['color_matrix'] = color_matrix
+            self.rows_data[self.current_row]['slot_matrix'] = slot_matrix or []
     
     def can_go_to_next_row(self):
         """Check if we can proceed to next row"""
@@ -78,7 +117,7 @@ class MultiRowManager:
             return False
         
         # Check if current row has required data
-        return (current_data['cropped_image'] is not None and
+        return (current_data['crop_box'] is not None and
                 len(current_data['corners']) == 4 and 
                 len(current_data['grid']) > 0)
     
@@ -130,37 +169,13 @@ class MultiRowManager:
         return self.get_all_completed_rows() == self.num_rows
     
     def get_color_name(self, rgb_color):
-        """Get human-readable name for RGB color"""
+        """Get human-readable name for RGB color (see color_names)"""
         try:
             r, g, b = rgb_color
         except:
             return "Couleur inconnue"
         
-        # Define color ranges with names
-        color_ranges = [
-            ((200, 255), (0, 50), (0, 50), "Rouge"),
-            ((0, 50), (200, 255), (0, 50), "Vert"),
-            ((0, 50), (0, 50), (200, 255), "Bleu"),
-            ((200, 255), (200, 255), (0, 100), "Jaune"),
-            ((200, 255), (0, 100), (200, 255), "Magenta"),
-            ((0, 100), (200, 255), (200, 255), "Cyan"),
-            ((200, 255), (100, 200), (0, 100), "Orange"),
-            ((100, 200), (0, 100), (200, 255), "Violet"),
-            ((100, 200), (50, 150), (0, 100), "Marron"),
-            ((180, 255), (180, 255), (180, 255), "Blanc"),
-            ((0, 80), (0, 80), (0, 80), "Noir"),
-            ((100, 180), (100, 180), (100, 180), "Gris"),
-        ]
-        
-        # Find best match
-        for r_range, g_range, b_range, name in color_ranges:
-            if (r_range[0] <= r <= r_range[1] and 
-                g_range[0] <= g <= g_range[1] and 
-                b_range[0] <= b <= b_range[1]):
-                return name
-        
-        # Default fallback
-        return f"Couleur ({r},{g},{b})"
+        return get_color_name((r, g, b))
     
     def color_distance(self, color1, color2):
         """Calculate Euclidean distance between two RGB colors"""
@@ -171,87 +186,195 @@ class MultiRowManager:
         except:
             return float('inf')
     
+    def merge_row_colors(self, color_groups, row_idx, row_colors, tolerance=40, keep_balls=False):
+        """Merge one row's colors into groups in place (first similar group wins)
+
+        Groups keep running RGB sums so the representative color (average
+        of all balls) is updated without re-scanning previous balls. Returns
+        the group index of each row color, in row_colors order.
+        """
+        group_ids = []
+        for color, balls in row_colors.items():
+            # Try to find existing group for this color
+            found_group = None
+            for group_id, group in enumerate(color_groups):
+                if self.color_distance(color, group['representative_color']) <= tolerance:
+                    found_group = group
+                    break
+            
+            sum_r = sum_g = sum_b = 0
+            for ball in balls:
+                ball_color = ball.get('color', color)
+                if not isinstance(ball_color, tuple):
+                    ball_color = color
+                sum_r += ball_color[0]
+                sum_g += ball_color[1]
+                sum_b += ball_color[2]
+            
+            if found_group:
+                # Add to existing group
+                found_group['total_count'] += len(balls)
+                found_group['rows'][row_idx] = found_group['rows'].get(row_idx, 0) + len(balls)
+                if keep_balls:
+                    found_group['all_balls'].extend(balls)
+                
+                # Update representative color (average)
+                found_group['color_sums'] = [found_group['color_sums'][0] + sum_r,
+                                             found_group['color_sums'][1] + sum_g,
+                                             found_group['color_sums'][2] + sum_b]
+                total_balls = found_group['total_count']
+                if total_balls > 0:
+                    found_group['representative_color'] = tuple(
+                        int(channel_sum / total_balls) for channel_sum in found_group['color_sums']
+                    )
+            else:
+                # Create new group
+                group = {
+                    'representative_color': color,
+                    'color_name': self.get_color_name(color),
+                    'total_count': len(balls),
+                    'rows': {row_idx: len(balls)},
+                    'color_sums': [sum_r, sum_g, sum_b]
+                }
+                if keep_balls:
+                    group['all_balls'] = balls.copy()
+                group_id = len(color_groups)
+                color_groups.append(group)
+            group_ids.append(group_id)
+        
+        return group_ids
+    
     def group_similar_colors(self, all_row_colors, tolerance=40):
         """Group similar colors across all rows with tolerance"""
         color_groups = []
         
         for row_idx, row_data in all_row_colors.items():
-            for color, balls in row_data.items():
-                # Try to find existing group for this color
-                found_group = None
-                for group in color_groups:
-                    if self.color_distance(color, group['representative_color']) <= tolerance:
-                        found_group = group
-                        break
-                
-                if found_group:
-                    # Add to existing group
-                    found_group['total_count'] += len(balls)
-                    found_group['rows'][f"R{row_idx+1}"] = len(balls)
-                    found_group['all_balls'].extend(balls)
-                    
-                    # Update representative color (average)
-                    total_balls = len(found_group['all_balls'])
-                    if total_balls > 0:
-                        avg_r = sum(ball.get('color', color)[0] if isinstance(ball.get('color', color), tuple) else color[0] for ball in found_group['all_balls']) / total_balls
-                        avg_g = sum(ball.get('color', color)[1] if isinstance(ball.get('color', color), tuple) else color[1] for ball in found_group['all_balls']) / total_balls
-                        avg_b = sum(ball.get('color', color)[2] if isinstance(ball.get('color', color), tuple) else color[2] for ball in found_group['all_balls']) / total_balls
-                        found_group['representative_color'] = (int(avg_r), int(avg_g), int(avg_b))
-                else:
-                    # Create new group
-                    color_groups.append({
-                        'representative_color': color,
-                        'color_name': self.get_color_name(color),
-                        'total_count': len(balls),
-                        'rows': {f"R{row_idx+1}": len(balls)},
-                        'all_balls': balls.copy()
-                    })
+            self.merge_row_colors(color_groups, row_idx, row_data, tolerance, keep_balls=True)
+        
+        return color_groups
+    
+    def copy_color_groups(self, color_groups):
+        """Copy group state (without ball lists) for a snapshot"""
+        return [dict(group, rows=dict(group['rows']), color_sums=list(group['color_sums']))
+                for group in color_groups]
+    
+    def mark_row_dirty(self, row_idx):
+        """Mark a row whose colors changed so aggregation re-merges it"""
+        self.dirty_rows.add(row_idx)
+        self.aggregated_results = None
+    
+    def invalidate_aggregation(self):
+        """Drop all memoized aggregation state"""
+        self.group_snapshots = {}
+        self.row_group_ids = {}
+        self.dirty_rows = set(self.rows_data.keys())
+        self.aggregated_results = None
+    
+    def get_combined_color_groups(self, tolerance=40):
+        """Get groups merged over all completed rows, re-merging only from the first dirty row
+
+        Grouping is order dependent (first similar group wins), so the group
+        state after each row is kept; rows before the first dirty one are
+        reused from their snapshot. Group indices are stable, see row_group_ids.
+        """
+        if tolerance != self.group_tolerance:
+            self.invalidate_aggregation()
+            self.group_tolerance = tolerance
+        
+        row_indices = sorted(self.rows_data.keys())
+        first_dirty = min(self.dirty_rows, default=None)
+        if first_dirty is None:
+            if not row_indices:
+                return []
+            return self.copy_color_groups(self.group_snapshots.get(row_indices[-1], []))
+        
+        previous = [idx for idx in row_indices if idx < first_dirty]
+        color_groups = self.copy_color_groups(self.group_snapshots.get(previous[-1], [])) if previous else []
+        
+        for row_idx in row_indices:
+            if row_idx < first_dirty:
+                continue
+            row_data = self.rows_data[row_idx]
+            if row_data['completed']:
+                self.row_group_ids[row_idx] = self.merge_row_colors(color_groups, row_idx,
+                                                                    row_data['colors'], tolerance)
+            else:
+                self.row_group_ids[row_idx] = []
+            self.group_snapshots[row_idx] = self.copy_color_groups(color_groups)
         
+        self.dirty_rows = set()
         return color_groups
     
+    @timed('MultiRowManager.get_aggregated_results')
     def get_aggregated_results(self):
-        """Get aggregated results from all rows"""
+        """Get aggregated results from all rows (memoized until a row changes)"""
+        if self.aggregated_results is not None:
+            return self.aggregated_results
+        
+        # Group similar colors with tolerance (only changed rows are re-merged)
+        combined_colors_groups = self.get_combined_color_groups()
+        
         total_balls = 0
-        all_colors = {}
         total_tubes = 0
-        
-        # Collect all row colors
-        all_row_colors = {}
-        for row_idx, row_data in self.rows_data.items():
+        row_colors = []
+        for row_idx in sorted(self.rows_data.keys()):
+            row_data = self.rows_data[row_idx]
             if not row_data['completed']:
                 continue
             
             total_tubes += row_data['num_tubes']
-            all_row_colors[row_idx] = row_data['colors']
             
-            # Add colors with row prefix for backward compatibility
-            for color, balls in row_data['colors'].items():
-                color_key = f"R{row_idx+1}_{color}"
-                all_colors[color_key] = balls
+            group_ids = self.row_group_ids.get(row_idx, [])
+            for (color, balls), color_id in zip(row_data['colors'].items(), group_ids):
+                row_colors.append(RowColorRecord(row_idx, color_id, tuple(color), len(balls)))
                 total_balls += len(balls)
         
-        # Group similar colors with tolerance
-        combined_colors_groups = self.group_similar_colors(all_row_colors)
+        # Row counts are copied: the group dicts live on in the merge snapshots
+        combined_colors = tuple(
+            CombinedColor(
+                color_id=color_id,
+                rgb=tuple(group['representative_color']),
+                name=group['color_name'],
+                total_count=group['total_count'],
+                row_counts=MappingProxyType(dict(group['rows']))
+            )
+            for color_id, group in enumerate(combined_colors_groups)
+        )
         
-        # Convert to dictionary format
-        combined_colors = {}
-        for i, group in enumerate(combined_colors_groups):
-            key = f"{group['color_name']}_{group['representative_color']}"
-            combined_colors[key] = {
-                'representative_color': group['representative_color'],
-                'color_name': group['color_name'],
-                'total_count': group['total_count'],
-                'rows': group['rows']
-            }
-        
-        return {
-            'total_balls': total_balls,
-            'total_tubes': total_tubes,
-            'colors_by_row': all_colors,
-            'combined_colors': combined_colors,
-            'completed_rows': self.get_all_completed_rows(),
-            'total_rows': self.num_rows
-        }
+        results = AggregatedResults(total_balls=total_balls, total_tubes=total_tubes,
+                                    completed_rows=self.get_all_completed_rows(),
+                                    total_rows=self.num_rows,
+                                    row_colors=tuple(row_colors),
+                                    combined_colors=combined_colors)
+        self.aggregated_results = results
+        return results
+    
+    def get_rows_layout(self):
+        """Get the calibration of every row (crop box, corners, radius, tubes)"""
+        layout = []
+        for row_idx in range(self.num_rows):
+            row_data = self.rows_data.get(row_idx)
+            if not row_data or row_data['crop_box'] is None or len(row_data['corners']) != 4:
+                return None
+            layout.append({
+                'crop_box': list(row_data['crop_box']),
+                'corners': [{'x': p['x'], 'y': p['y']} for p in row_data['corners']],
+                'radius': row_data['radius'],
+                'num_tubes': row_data['num_tubes'],
+                'balls_per_tube': row_data['balls_per_tube']
+            })
+        return layout
+    
+    def load_rows_layout(self, layout):
+        """Reset rows from a calibration layout (see get_rows_layout)"""
+        self.set_num_rows(len(layout))
+        for row_idx, row in enumerate(layout):
+            row_data = self.rows_data[row_idx]
+            row_data['crop_box'] = tuple(row['crop_box'])
+            row_data['corners'] = [{'x': p['x'], 'y': p['y']} for p in row['corners']]
+            row_data['radius'] = row['radius']
+            row_data['num_tubes'] = row['num_tubes']
+            row_data['balls_per_tube'] = row['balls_per_tube']
     
     def reset(self):
         """Reset manager to initial state"""
@@ -259,6 +382,7 @@ class MultiRowManager:
         self.current_row = 0
         self.rows_data = {}
         self.is_multi_row_mode = False
+        self.invalidate_aggregation()
     
     def get_current_row_number(self):
         """Get current row number (1-based)"""
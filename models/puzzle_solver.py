@@ -0,0 +1,155 @@
+"""
+Reference solver for Ball Sort color matrices
+"""
+import heapq
+import itertools
+
+class PuzzleSolver:
+    def __init__(self, max_nodes=200000, heuristic_weight=2):
+        self.max_nodes = max_nodes
+        self.heuristic_weight = heuristic_weight
+        self.expanded_nodes = 0
+
+    def solve(self, color_matrix):
+        """Solve a color matrix (one list per tube, top slot first, None = empty)
+
+        Returns a dict with 'solved', 'moves' (list of (from_tube, to_tube))
+        and 'expanded_nodes'.
+        """
+        self.expanded_nodes = 0
+        if not color_matrix:
+            return {'solved': True, 'moves': [], 'expanded_nodes': 0}
+
+        capacity = max(len(tube) for tube in color_matrix)
+        start = self.matrix_to_state(color_matrix)
+
+        if self.is_solved(start, capacity):
+            return {'solved': True, 'moves': [], 'expanded_nodes': 0}
+
+        # Weighted A*: tubes are interchangeable, so visited states are keyed
+        # on the sorted tube tuple
+        counter = itertools.count()
+        open_heap = [(self.heuristic(start, capacity), next(counter), 0, start)]
+        parents = {self.state_key(start): None}
+        best_cost = {self.state_key(start): 0}
+
+        while open_heap and self.expanded_nodes < self.max_nodes:
+            _, _, cost, state = heapq.heappop(open_heap)
+            key = self.state_key(state)
+            if best_cost.get(key, cost) < cost:
+                continue
+
+            self.expanded_nodes += 1
+
+            for move, next_state in self.get_moves(state, capacity):
+                next_key = self.state_key(next_state)
+                next_cost = cost + 1
+                if next_key in best_cost and best_cost[next_key] <= next_cost:
+                    continue
+
+                best_cost[next_key] = next_cost
+                parents[next_key] = key
+
+                if self.is_solved(next_state, capacity):
+                    return {
+                        'solved': True,
+                        'moves': self.rebuild_moves(parents, next_key, start, capacity),
+                        'expanded_nodes': self.expanded_nodes
+                    }
+
+                priority = next_cost + self.heuristic_weight * self.heuristic(next_state, capacity)
+                heapq.heappush(open_heap, (priority, next(counter), next_cost, next_state))
+
+        return {'solved': False, 'moves': [], 'expanded_nodes': self.expanded_nodes}
+
+    def matrix_to_state(self, color_matrix):
+        """Convert color matrix to a state of tubes (bottom to top tuples)"""
+        palette = {}
+        state = []
+        for tube in color_matrix:
+            balls = []
+            for color in reversed(tube):
+                if color is None:
+                    continue
+                if color not in palette:
+                    palette[color] = len(palette)
+                balls.append(palette[color])
+            state.append(tuple(balls))
+        return tuple(state)
+
+    def state_key(self, state):
+        """Canonical key for a state (tube order does not matter)"""
+        return tuple(sorted(state))
+
+    def is_solved(self, state, capacity):
+        """Check if every tube is empty or full of a single color"""
+        for tube in state:
+            if not tube:
+                continue
+            if len(tube) != capacity or tube.count(tube[0]) != len(tube):
+                return False
+        return True
+
+    def heuristic(self, state, capacity):
+        """Count balls sitting above a different color (they must move at least once)"""
+        misplaced = 0
+        for tube in state:
+            for idx in range(1, len(tube)):
+                if tube[idx] != tube[idx - 1]:
+                    misplaced += len(tube) - idx
+                    break
+        return misplaced
+
+    def get_moves(self, state, capacity):
+        """Yield (move, next_state) pairs, pouring the whole top run when possible"""
+        for src, src_tube in enumerate(state):
+            if not src_tube:
+                continue
+
+            top_color = src_tube[-1]
+            run = 1
+            while run < len(src_tube) and src_tube[-1 - run] == top_color:
+                run += 1
+            is_uniform = run == len(src_tube)
+            tried_empty = False
+
+            for dst, dst_tube in enumerate(state):
+                if dst == src or len(dst_tube) >= capacity:
+                    continue
+
+                if not dst_tube:
+                    # Moving a uniform tube into an empty one is pointless, and
+                    # all empty tubes are equivalent
+                    if is_uniform or tried_empty:
+                        continue
+                    tried_empty = True
+                elif dst_tube[-1] != top_color:
+                    continue
+
+                amount = min(run, capacity - len(dst_tube))
+                next_state = list(state)
+                next_state[src] = src_tube[:-amount]
+                next_state[dst] = dst_tube + (top_color,) * amount
+                yield (src, dst), tuple(next_state)
+
+    def rebuild_moves(self, parents, key, start, capacity):
+        """Rebuild the move list by replaying the chain of canonical states
+
+        Visited states are stored without tube order, so each step is matched
+        against the moves available from the actual layout.
+        """
+        chain = []
+        while key is not None:
+            chain.append(key)
+            key = parents[key]
+        chain.reverse()
+
+        moves = []
+        state = start
+        for next_key in chain[1:]:
+            for move, next_state in self.get_moves(state, capacity):
+                if self.state_key(next_state) == next_key:
+                    moves.append(move)
+                    state = next_state
+                    break
+        return moves
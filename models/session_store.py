@@ -0,0 +1,197 @@
+"""
+Compact session save/load for MultiRowManager state (.npz)
+
+No pixels are stored: rows keep their crop box and the image is reloaded
+from its path. Colors are packed into one palette and referenced by id,
+grids and balls are integer arrays, and the grid matrix is rebuilt from
+the grid on load.
+"""
+import json
+import numpy as np
+from instrumentation import timed
+from grid_generator import build_grid_matrix
+
+SESSION_VERSION = 1
+
+# Column layouts of the packed arrays
+GRID_COLUMNS = ('x', 'y', 'radius', 'tube_idx', 'ball_idx')
+BALL_COLUMNS = ('x', 'y', 'radius', 'grid_i', 'grid_j', 'group_id')
+# Slot status codes of the packed slot matrix
+SLOT_STATUSES = ('empty', 'uncertain', 'ball')
+
+class ColorPalette:
+    def __init__(self):
+        self.colors = []
+        self.ids = {}
+
+    def get_id(self, color):
+        """Get the palette id of a color (added on first use)"""
+        color = tuple(int(c) for c in color)
+        if color not in self.ids:
+            self.ids[color] = len(self.colors)
+            self.colors.append(color)
+        return self.ids[color]
+
+    def to_array(self):
+        """Get the palette as a (K, 3) uint8 array"""
+        return np.array(self.colors, dtype=np.uint8).reshape(-1, 3)
+
+def pack_grid(grid):
+    """Pack grid circles into an (N, 5) int32 array"""
+    return np.array([[circle['x'], circle['y'], circle['radius'],
+                      circle.get('tube_idx', circle.get('grid_i', 0)),
+                      circle.get('ball_idx', circle.get('grid_j', 0))] for circle in grid],
+                    dtype=np.int32).reshape(-1, len(GRID_COLUMNS))
+
+def unpack_grid(array):
+    """Rebuild grid circle dicts from a packed array"""
+    return [{'x': x, 'y': y, 'radius': radius,
+             'tube_idx': tube_idx, 'ball_idx': ball_idx,
+             'grid_i': tube_idx, 'grid_j': ball_idx}
+            for x, y, radius, tube_idx, ball_idx in array.tolist()]
+
+def pack_colors(color_groups, palette):
+    """Pack color groups into ball rows and per-ball colors"""
+    balls = []
+    ball_colors = []
+    for group_color, group_balls in color_groups.items():
+        group_id = palette.get_id(group_color)
+        for ball in group_balls:
+            grid_i, grid_j = ball.get('grid_position', (0, 0))
+            balls.append([ball['x'], ball['y'], ball['radius'], grid_i, grid_j, group_id])
+            ball_colors.append(ball['color'])
+    return (np.array(balls, dtype=np.int32).reshape(-1, len(BALL_COLUMNS)),
+            np.array(ball_colors, dtype=np.uint8).reshape(-1, 3))
+
+def unpack_colors(balls, ball_colors, palette_colors):
+    """Rebuild color groups (group color -> list of ball dicts)"""
+    color_groups = {}
+    for (x, y, radius, grid_i, grid_j, group_id), color in zip(balls.tolist(), ball_colors.tolist()):
+        group_color = palette_colors[group_id]
+        color_groups.setdefault(group_color, []).append({
+            'x': x,
+            'y': y,
+            'radius': radius,
+            'color': tuple(color),
+            'grid_position': (grid_i, grid_j)
+        })
+    return color_groups
+
+def pack_color_matrix(color_matrix, palette):
+    """Pack a color matrix into an int16 array of palette ids (-1 = empty)"""
+    return np.array([[palette.get_id(color) if color else -1 for color in tube]
+                     for tube in color_matrix], dtype=np.int16)
+
+def unpack_color_matrix(array, palette_colors):
+    """Rebuild a color matrix from palette ids"""
+    return [[palette_colors[color_id] if color_id >= 0 else None for color_id in tube]
+            for tube in array.tolist()]
+
+def pack_slot_matrix(slot_matrix):
+    """Pack a slot matrix into status code, color id (-1 = none) and confidence arrays"""
+    status = np.array([[SLOT_STATUSES.index(slot['status']) for slot in tube] for tube in slot_matrix],
+                      dtype=np.int8)
+    color_ids = np.array([[-1 if slot['color_id'] is None else slot['color_id'] for slot in tube]
+                          for tube in slot_matrix], dtype=np.int16)
+    confidence = np.array([[slot['confidence'] for slot in tube] for tube in slot_matrix],
+                          dtype=np.float64)
+    return status, color_ids, confidence
+
+def unpack_slot_matrix(status, color_ids, confidence):
+    """Rebuild a slot matrix from its packed arrays"""
+    return [[{'status': SLOT_STATUSES[code], 'color_id': color_id if color_id >= 0 else None,
+              'confidence': slot_confidence}
+             for code, color_id, slot_confidence in zip(tube_status, tube_ids, tube_confidence)]
+            for tube_status, tube_ids, tube_confidence in zip(status.tolist(), color_ids.tolist(),
+                                                              confidence.tolist())]
+
+@timed('session_store.save_session')
+def save_session(path, multi_row_manager, image_info=None):
+    """Save manager state (and image reference) to a compact .npz file
+
+    image_info is a JSON-serializable dict describing how to reload the
+    image (path, analysis size); the pixels themselves are never stored.
+    """
+    palette = ColorPalette()
+    arrays = {}
+    rows = []
+
+    for row_idx in range(multi_row_manager.num_rows):
+        row_data = multi_row_manager.rows_data[row_idx]
+        prefix = f"row{row_idx}_"
+
+        rows.append({
+            'crop_box': list(row_data['crop_box']) if row_data['crop_box'] else None,
+            'auto_crop': row_data['auto_crop'],
+            'radius': row_data['radius'],
+            'num_tubes': row_data['num_tubes'],
+            'balls_per_tube': row_data['balls_per_tube'],
+            'completed': row_data['completed'],
+            'has_grid_matrix': bool(row_data['grid_matrix']),
+            'has_slot_matrix': bool(row_data['slot_matrix'])
+        })
+
+        arrays[prefix + 'corners'] = np.array([[p['x'], p['y']] for p in row_data['corners']],
+                                              dtype=np.int32).reshape(-1, 2)
+        arrays[prefix + 'grid'] = pack_grid(row_data['grid'])
+        arrays[prefix + 'balls'], arrays[prefix + 'ball_colors'] = pack_colors(row_data['colors'], palette)
+        arrays[prefix + 'color_matrix'] = pack_color_matrix(row_data['color_matrix'], palette)
+        if row_data['slot_matrix']:
+            (arrays[prefix + 'slot_status'], arrays[prefix + 'slot_color_ids'],
+             arrays[prefix + 'slot_confidence']) = pack_slot_matrix(row_data['slot_matrix'])
+
+    meta = {
+        'version': SESSION_VERSION,
+        'num_rows': multi_row_manager.num_rows,
+        'current_row': multi_row_manager.current_row,
+        'rows': rows,
+        'image': image_info or {}
+    }
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+    arrays['palette'] = palette.to_array()
+
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+@timed('session_store.load_session')
+def load_session(path, multi_row_manager):
+    """Restore manager state from a .npz session, return the image info dict
+
+    Arrays are read from the archive one by one as rows are rebuilt; the
+    image is left to the caller.
+    """
+    with np.load(path, allow_pickle=False) as session:
+        meta = json.loads(session['meta'].tobytes().decode('utf-8'))
+        if meta.get('version') != SESSION_VERSION:
+            raise ValueError(f"Version de session non supportée: {meta.get('version')}")
+
+        palette_colors = [tuple(color) for color in session['palette'].tolist()]
+
+        multi_row_manager.set_num_rows(meta['num_rows'])
+        for row_idx, row in enumerate(meta['rows']):
+            row_data = multi_row_manager.rows_data[row_idx]
+            prefix = f"row{row_idx}_"
+
+            row_data['crop_box'] = tuple(row['crop_box']) if row['crop_box'] else None
+            # Sessions saved before automatic crops have manual boxes only
+            row_data['auto_crop'] = row.get('auto_crop', False)
+            row_data['radius'] = row['radius']
+            row_data['num_tubes'] = row['num_tubes']
+            row_data['balls_per_tube'] = row['balls_per_tube']
+            row_data['completed'] = row['completed']
+            row_data['corners'] = [{'x': x, 'y': y} for x, y in session[prefix + 'corners'].tolist()]
+            row_data['grid'] = unpack_grid(session[prefix + 'grid'])
+            row_data['colors'] = unpack_colors(session[prefix + 'balls'], session[prefix + 'ball_colors'],
+                                               palette_colors)
+            row_data['color_matrix'] = unpack_color_matrix(session[prefix + 'color_matrix'], palette_colors)
+            if row['has_grid_matrix']:
+                row_data['grid_matrix'] = build_grid_matrix(row_data['grid'], row['num_tubes'],
+                                                            row['balls_per_tube'])
+            if row.get('has_slot_matrix'):
+                row_data['slot_matrix'] = unpack_slot_matrix(session[prefix + 'slot_status'],
+                                                             session[prefix + 'slot_color_ids'],
+                                                             session[prefix + 'slot_confidence'])
+
+        multi_row_manager.current_row = min(meta['current_row'], multi_row_manager.num_rows - 1)
+
+    return meta['image']
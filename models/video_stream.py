@@ -0,0 +1,163 @@
+"""
+Streaming analysis of gameplay recordings with frame deduplication
+"""
+import math
+import numpy as np
+from color_analyzer import ColorAnalyzer
+from instrumentation import timed
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+class VideoStreamAnalyzer:
+    def __init__(self, grid_generator, crop_box=None, tolerance=40,
+                 change_threshold=12.0, settle_frames=1, frame_step=1):
+        """Analyze a video with one fixed calibration
+
+        grid_generator must already hold the corners, radius and tube
+        parameters (in crop coordinates); crop_box is (left, top, right,
+        bottom) in frame coordinates, or None for the whole frame.
+        """
+        self.grid_generator = grid_generator
+        self.crop_box = crop_box
+        self.change_threshold = change_threshold
+        self.settle_frames = max(0, settle_frames)
+        self.frame_step = max(1, frame_step)
+
+        self.color_analyzer = ColorAnalyzer(tolerance)
+        self.color_analyzer.set_tolerance(tolerance)
+        self.num_tubes, self.balls_per_tube = grid_generator.get_tube_parameters()
+        self.grid = grid_generator.generate_grid()
+
+        # Sparse per-circle sample points used for the cheap frame diff
+        self.signature_xs, self.signature_ys = self.build_signature_points(self.grid)
+
+        self.stats = {'frames_read': 0, 'frames_analyzed': 0, 'matrices_emitted': 0}
+
+    def build_signature_points(self, grid, points_per_ring=8):
+        """Build sample coordinates (center plus two rings) for every circle"""
+        xs = []
+        ys = []
+        for circle in grid:
+            x, y, radius = circle['x'], circle['y'], circle['radius']
+            circle_xs = [x]
+            circle_ys = [y]
+            for ring in (0.35, 0.6):
+                for k in range(points_per_ring):
+                    angle = 2 * math.pi * k / points_per_ring
+                    circle_xs.append(int(x + ring * radius * math.cos(angle)))
+                    circle_ys.append(int(y + ring * radius * math.sin(angle)))
+            xs.append(circle_xs)
+            ys.append(circle_ys)
+        return np.array(xs, dtype=np.intp), np.array(ys, dtype=np.intp)
+
+    def iter_frames(self, video_path):
+        """Yield (frame_index, timestamp_ms, RGB crop view) from a video file"""
+        if cv2 is None:
+            raise ImportError("OpenCV (opencv-python) est requis pour lire les vidéos")
+
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise IOError(f"Impossible d'ouvrir la vidéo: {video_path}")
+
+        try:
+            frame_index = 0
+            while True:
+                if frame_index % self.frame_step:
+                    # Skipped frames are only demuxed, never decoded to pixels
+                    if not capture.grab():
+                        break
+                    frame_index += 1
+                    continue
+
+                ok, frame = capture.read()
+                if not ok:
+                    break
+
+                timestamp_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+                if self.crop_box:
+                    left, top, right, bottom = self.crop_box
+                    frame = frame[top:bottom, left:right]
+
+                # BGR -> RGB as a view, no copy
+                yield frame_index, timestamp_ms, frame[:, :, ::-1]
+                frame_index += 1
+        finally:
+            capture.release()
+
+    def frame_signature(self, frame):
+        """Sample the sparse per-circle points of a frame (n_circles x points x 3)"""
+        height, width = frame.shape[:2]
+        xs = np.clip(self.signature_xs, 0, width - 1)
+        ys = np.clip(self.signature_ys, 0, height - 1)
+        return frame[ys, xs].astype(np.int16)
+
+    def signature_distance(self, signature, reference):
+        """Largest per-circle mean absolute difference between two signatures"""
+        if reference is None:
+            return float('inf')
+        return float(np.abs(signature - reference).mean(axis=(1, 2)).max())
+
+    @timed('VideoStreamAnalyzer.analyze_frame')
+    def analyze_frame(self, frame):
+        """Analyze a frame and build its color matrix
+
+        Only circles that changed since the previous analyzed frame are
+        re-sampled; when a ball changed, the analyzer regroups every ball
+        into a new color_groups dict, so the groups returned stay valid.
+        """
+        self.color_analyzer.analyze_grid_circles_incremental(frame, self.grid)
+        color_groups = self.color_analyzer.color_groups
+        matrix = self.color_analyzer.build_color_matrix(self.num_tubes, self.balls_per_tube, color_groups)
+        return matrix, color_groups
+
+    def stream_matrices(self, video_path):
+        """Yield a result for every distinct board state of a video
+
+        A frame is analyzed only when its sampled ball pixels differ from the
+        last analyzed frame and have been stable for settle_frames frames
+        (skipping mid-animation frames). A result is emitted only when the
+        color matrix itself changes.
+        """
+        self.color_analyzer.reset_incremental_state()
+        analyzed_signature = None
+        previous_signature = None
+        stable_count = 0
+        last_matrix = None
+
+        for frame_index, timestamp_ms, frame in self.iter_frames(video_path):
+            self.stats['frames_read'] += 1
+            signature = self.frame_signature(frame)
+
+            if self.signature_distance(signature, previous_signature) <= self.change_threshold:
+                stable_count += 1
+            else:
+                stable_count = 0
+            previous_signature = signature
+
+            if stable_count < self.settle_frames:
+                continue
+            if self.signature_distance(signature, analyzed_signature) <= self.change_threshold:
+                continue
+
+            analyzed_signature = signature
+            self.stats['frames_analyzed'] += 1
+            matrix, color_groups = self.analyze_frame(frame)
+
+            if matrix == last_matrix:
+                continue
+
+            last_matrix = matrix
+            self.stats['matrices_emitted'] += 1
+            yield {
+                'frame_index': frame_index,
+                'timestamp_ms': timestamp_ms,
+                'color_matrix': matrix,
+                'color_groups': color_groups
+            }
+
+    def get_stats(self):
+        """Get frame counters (read, analyzed, emitted)"""
+        return dict(self.stats)
@@ -0,0 +1,106 @@
+"""
+Headless checks of the analysis pipeline on synthetic boards
+"""
+import io
+import sys
+import os
+import tempfile
+
+from PIL import Image, ImageDraw
+
+# Add paths
+sys.path.append(os.path.join(os.path.dirname(__file__), 'models'))
+
+from image_processor import ImageProcessor
+from multi_row_manager import MultiRowManager
+from analysis_pipeline import analyze_row, analyze_rows, store_row_analyses, analyze_image_bytes
+from session_store import save_session, load_session
+
+COLORS = [(220, 40, 40), (40, 200, 60), (40, 80, 220), (230, 220, 40)]
+ROW_HEIGHT = 300
+
+def make_board(num_rows=2):
+    """Board of num_rows rows of 5 tubes x 4 balls (last tube empty), PNG bytes"""
+    image = Image.new('RGB', (600, ROW_HEIGHT * num_rows), (20, 20, 20))
+    draw = ImageDraw.Draw(image)
+    for row in range(num_rows):
+        for tube in range(4):
+            for ball in range(4):
+                x = 50 + tube * 120
+                y = row * ROW_HEIGHT + 50 + ball * 60
+                draw.ellipse([x - 20, y - 20, x + 20, y + 20], fill=COLORS[(tube + ball + row) % 4])
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def make_row_layout(row):
+    """Calibration of one row (corners relative to its crop box)"""
+    top = row * ROW_HEIGHT
+    return {
+        'crop_box': [10, top + 10, 590, top + 290],
+        'corners': [{'x': 40, 'y': 40}, {'x': 520, 'y': 40}, {'x': 40, 'y': 220}, {'x': 520, 'y': 220}],
+        'radius': 18,
+        'num_tubes': 5,
+        'balls_per_tube': 4
+    }
+
+def load_board(num_rows=2):
+    image_processor = ImageProcessor()
+    image_processor.load_image(io.BytesIO(make_board(num_rows)))
+    return image_processor
+
+def test_concurrent_rows_match_sequential_rows():
+    layouts = [make_row_layout(row) for row in range(3)]
+    image_processor = load_board(3)
+
+    analyses = analyze_rows(image_processor, layouts, max_workers=3)
+    sequential = [analyze_row(image_processor, layout)[0] for layout in layouts]
+
+    assert [analysis.row_index for analysis in analyses] == [0, 1, 2]
+    assert [analysis.result for analysis in analyses] == sequential
+    assert all(result['total_balls'] == 16 for result in sequential)
+
+def test_store_row_analyses_fills_every_row():
+    layouts = [make_row_layout(row) for row in range(2)]
+    image_processor = load_board(2)
+    manager = MultiRowManager()
+    manager.set_num_rows(2)
+
+    store_row_analyses(manager, analyze_rows(image_processor, layouts))
+
+    assert manager.current_row == 0
+    assert manager.get_all_completed_rows() == 2
+    assert manager.get_aggregated_results().total_balls == 32
+
+def test_auto_crop_reads_corners_in_image_coordinates():
+    rows = []
+    for row in range(2):
+        layout = make_row_layout(row)
+        left, top = layout.pop('crop_box')[:2]
+        layout['corners'] = [{'x': p['x'] + left, 'y': p['y'] + top} for p in layout['corners']]
+        rows.append(layout)
+
+    result = analyze_image_bytes(make_board(2), {'rows': rows, 'auto_crop': True})
+
+    assert [row['total_balls'] for row in result['rows']] == [16, 16]
+    assert all(row['uncertain_slots'] == 0 for row in result['rows'])
+    for row_index, row in enumerate(result['rows']):
+        left, top, right, bottom = row['crop_box']
+        assert row_index * ROW_HEIGHT <= top < bottom <= (row_index + 1) * ROW_HEIGHT
+
+def test_session_round_trip_keeps_auto_crop_flags():
+    manager = MultiRowManager()
+    manager.set_num_rows(2)
+    for row in range(2):
+        manager.current_row = row
+        manager.set_current_row_crop_box(tuple(make_row_layout(row)['crop_box']), auto=(row == 0))
+    manager.current_row = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.npz')
+        save_session(path, manager)
+        restored = MultiRowManager()
+        load_session(path, restored)
+
+    assert [restored.rows_data[row]['auto_crop'] for row in range(2)] == [True, False]
+    assert restored.rows_data[1]['crop_box'] == tuple(make_row_layout(1)['crop_box'])
@@ -0,0 +1,25 @@
+"""
+Round-trip checks of the solver board formats
+"""
+import sys
+import os
+
+# Add paths
+sys.path.append(os.path.join(os.path.dirname(__file__), 'models'))
+
+from matrix_export import board_to_text, board_from_text
+
+def test_text_round_trip_keeps_empty_rows_and_trailing_empty_tubes():
+    board = {
+        'palette': [],
+        'rows': [
+            {'capacity': 4, 'tubes': [[1, 1, 2, 2], [2, 2, 1, 1], [], []]},
+            {'capacity': 3, 'tubes': []},
+            {'capacity': 2, 'tubes': [[3], [10, 35]]}
+        ]
+    }
+
+    text = board_to_text(board)
+
+    assert text == "4:1122,2211,,/3:/2:3,az"
+    assert board_from_text(text) == board
@@ -2,7 +2,11 @@
 Corner selection tool for grid calibration
 """
 import customtkinter as ctk
+import numpy as np
 from PIL import Image, ImageTk, ImageDraw
+from grid_generator import GridGenerator
+from color_analyzer import ColorAnalyzer
+from instrumentation import span
 
 class CornerSelector:
     def __init__(self, parent, on_corners_complete=None):
@@ -19,15 +23,33 @@ class CornerSelector:
         self.corner_points = []
         self.point_ids = []
         self.selected_point = None
+        
+        # Live grid preview: pooled canvas ovals moved with coords()
+        self.grid_generator = GridGenerator()
+        self.grid_item_ids = []
+        self.redraw_job = None
+        self.frame_delay_ms = 16
+        
+        # Color preview: each grid circle is filled with the color it samples,
+        # read from the pixels of the (already downscaled) display image
+        self.color_analyzer = ColorAnalyzer()
+        self.preview_pixels = None
+        self.show_color_preview = True
     
-    def open_corner_dialog(self, image):
-        """Open corner selection dialog"""
+    def open_corner_dialog(self, image, num_tubes=5, balls_per_tube=4, corner_points=None, radius=None):
+        """Open corner selection dialog (existing corners can be given to adjust them)"""
         if self.selector_window and self.selector_window.winfo_exists():
             self.selector_window.destroy()
         
         self.image = image
-        self.corner_points = []
+        self.corner_points = [{'x': p['x'], 'y': p['y']} for p in (corner_points or [])][:4]
         self.point_ids = []
+        self.grid_item_ids = []
+        self.redraw_job = None
+        self.selected_point = None
+        if radius:
+            self.circle_radius = int(radius)
+        self.grid_generator.set_tube_parameters(num_tubes, balls_per_tube)
         
         self.selector_window = ctk.CTkToplevel(self.parent)
         self.selector_window.title("Sélection des coins")
@@ -44,7 +66,8 @@ class CornerSelector:
         
         instructions = ctk.CTkLabel(
             top_frame,
-            text="Cliquez sur les 4 coins des balles : Haut-Gauche, Haut-Droite, Bas-Gauche, Bas-Droite",
+            text="Cliquez sur les 4 coins des balles : Haut-Gauche, Haut-Droite, Bas-Gauche, Bas-Droite\n"
+                 "Glissez un coin pour ajuster la grille affichée en direct",
             font=ctk.CTkFont(size=12)
         )
         instructions.pack(pady=5)
@@ -65,6 +88,10 @@ class CornerSelector:
         self.radius_label = ctk.CTkLabel(control_frame, text=f"{self.circle_radius}px")
         self.radius_label.pack(side="left")
         
+        self.preview_var = ctk.BooleanVar(value=self.show_color_preview)
+        ctk.CTkCheckBox(control_frame, text="Aperçu des couleurs", variable=self.preview_var,
+                        command=self.on_preview_toggle).pack(side="left", padx=10)
+        
         # Canvas frame
         canvas_frame = ctk.CTkFrame(self.selector_window)
         canvas_frame.pack(expand=True, fill="both", padx=10, pady=5)
@@ -88,6 +115,8 @@ class CornerSelector:
         
         # Bind events
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_canvas_release)
         
         # Status frame
         status_frame = ctk.CTkFrame(self.selector_window)
@@ -130,6 +159,13 @@ class CornerSelector:
         ctk.CTkButton(buttons_frame, text="❌ Annuler", command=self.cancel_selection,
                      fg_color="#f44336", hover_color="#da190b",
                      font=ctk.CTkFont(size=12, weight="bold"), height=35).pack(side="left", padx=5)
+        
+        # Show corners given by the caller
+        if self.corner_points:
+            self.update_visual_circles()
+            self.update_status()
+            self.update_points_list()
+            self.schedule_grid_redraw()
     
     def load_image_to_canvas(self):
         """Load image to canvas"""
@@ -150,6 +186,7 @@ class CornerSelector:
         
         display_image = self.image.resize((display_width, display_height), Image.Resampling.LANCZOS)
         self.photo = ImageTk.PhotoImage(display_image)
+        self.preview_pixels = np.asarray(display_image.convert('RGB'))
         
         self.canvas.configure(scrollregion=(0, 0, display_width, display_height))
         self.canvas.create_image(0, 0, anchor="nw", image=self.photo)
@@ -161,70 +198,145 @@ class CornerSelector:
         
         # Update visual circles
         self.update_visual_circles()
+        self.schedule_grid_redraw()
+    
+    def on_preview_toggle(self):
+        """Show or hide the sampled colors of the grid circles"""
+        self.show_color_preview = self.preview_var.get()
+        self.schedule_grid_redraw()
+    
+    def find_corner_at(self, canvas_x, canvas_y):
+        """Get the index of the corner under a canvas position (None if none)"""
+        grab_radius = max(8, self.circle_radius * self.scale_factor)
+        for idx, point in enumerate(self.corner_points):
+            dx = point['x'] * self.scale_factor - canvas_x
+            dy = point['y'] * self.scale_factor - canvas_y
+            if dx * dx + dy * dy <= grab_radius * grab_radius:
+                return idx
+        return None
     
     def on_canvas_click(self, event):
-        """Handle canvas click"""
-        if len(self.corner_points) >= 4:
-            return
-        
+        """Handle canvas click: grab an existing corner or add a new one"""
         canvas_x = self.canvas.canvasx(event.x)
         canvas_y = self.canvas.canvasy(event.y)
         
+        self.selected_point = self.find_corner_at(canvas_x, canvas_y)
+        if self.selected_point is not None or len(self.corner_points) >= 4:
+            return
+        
         # Convert to original image coordinates
         orig_x = int(canvas_x / self.scale_factor)
         orig_y = int(canvas_y / self.scale_factor)
         
         # Add point
         self.corner_points.append({'x': orig_x, 'y': orig_y})
+        self.update_visual_circles()
         
-        # Draw visual circle on canvas
-        display_radius = int(self.circle_radius * self.scale_factor)
-        circle_id = self.canvas.create_oval(
-            canvas_x - display_radius, canvas_y - display_radius,
-            canvas_x + display_radius, canvas_y + display_radius,
-            outline="red", width=2, fill="", dash=(3, 3)
-        )
+        self.update_status()
+        self.update_points_list()
+        self.schedule_grid_redraw()
+    
+    def on_canvas_drag(self, event):
+        """Move the grabbed corner; the grid follows at most once per frame"""
+        if self.selected_point is None:
+            return
         
-        # Draw center point
-        center_id = self.canvas.create_oval(
-            canvas_x - 3, canvas_y - 3,
-            canvas_x + 3, canvas_y + 3,
-            fill="red", outline="red"
-        )
+        canvas_x = self.canvas.canvasx(event.x)
+        canvas_y = self.canvas.canvasy(event.y)
+        point = self.corner_points[self.selected_point]
+        # Keep the corner on the image when dragged past the canvas edge
+        img_width, img_height = self.image.size
+        point['x'] = min(max(int(canvas_x / self.scale_factor), 0), img_width - 1)
+        point['y'] = min(max(int(canvas_y / self.scale_factor), 0), img_height - 1)
         
-        self.point_ids.append((circle_id, center_id))
+        self.move_corner_items(self.selected_point)
+        self.schedule_grid_redraw()
+    
+    def on_canvas_release(self, event):
+        """Drop the grabbed corner"""
+        if self.selected_point is not None:
+            self.selected_point = None
+            self.update_points_list()
+    
+    def move_corner_items(self, idx):
+        """Move the canvas items of one corner to its current position"""
+        point = self.corner_points[idx]
+        canvas_x = point['x'] * self.scale_factor
+        canvas_y = point['y'] * self.scale_factor
+        display_radius = int(self.circle_radius * self.scale_factor)
         
-        self.update_status()
-        self.update_points_list()
+        circle_id, center_id = self.point_ids[idx]
+        self.canvas.coords(circle_id, canvas_x - display_radius, canvas_y - display_radius,
+                           canvas_x + display_radius, canvas_y + display_radius)
+        self.canvas.coords(center_id, canvas_x - 3, canvas_y - 3, canvas_x + 3, canvas_y + 3)
     
     def update_visual_circles(self):
-        """Update visual representation of circles"""
-        # Remove old circles
-        for circle_id, center_id in self.point_ids:
-            self.canvas.delete(circle_id)
-            self.canvas.delete(center_id)
+        """Update visual representation of circles (items are created once, then moved)"""
+        # Drop items of removed corners
+        while len(self.point_ids) > len(self.corner_points):
+            for item_id in self.point_ids.pop():
+                self.canvas.delete(item_id)
+        
+        # Create items for new corners
+        while len(self.point_ids) < len(self.corner_points):
+            circle_id = self.canvas.create_oval(0, 0, 0, 0, outline="red", width=2, fill="", dash=(3, 3))
+            center_id = self.canvas.create_oval(0, 0, 0, 0, fill="red", outline="red")
+            self.point_ids.append((circle_id, center_id))
         
-        self.point_ids = []
+        for idx in range(len(self.corner_points)):
+            self.move_corner_items(idx)
+    
+    def schedule_grid_redraw(self):
+        """Redraw the grid preview on the next frame (repeated requests are merged)"""
+        if self.redraw_job is None and self.selector_window:
+            self.redraw_job = self.selector_window.after(self.frame_delay_ms, self.redraw_grid)
+    
+    def redraw_grid(self):
+        """Move the pooled grid ovals to the grid of the current corners and radius
+
+        With the color preview on, each oval is filled with the dominant
+        color sampled under it on the display image (one vectorized pass
+        for the whole grid).
+        """
+        self.redraw_job = None
+        if not self.canvas:
+            return
         
-        # Redraw circles with new radius
-        for point in self.corner_points:
-            canvas_x = point['x'] * self.scale_factor
-            canvas_y = point['y'] * self.scale_factor
-            display_radius = int(self.circle_radius * self.scale_factor)
+        with span('CornerSelector.redraw_grid'):
+            grid = []
+            if len(self.corner_points) == 4:
+                self.grid_generator.set_corner_points(self.corner_points)
+                self.grid_generator.set_ball_radius(self.circle_radius)
+                grid = self.grid_generator.generate_grid()
             
-            circle_id = self.canvas.create_oval(
-                canvas_x - display_radius, canvas_y - display_radius,
-                canvas_x + display_radius, canvas_y + display_radius,
-                outline="red", width=2, fill="", dash=(3, 3)
-            )
+            # Grid circles in display coordinates
+            display_circles = [{'x': int(round(circle['x'] * self.scale_factor)),
+                                'y': int(round(circle['y'] * self.scale_factor)),
+                                'radius': max(2, int(round(circle['radius'] * self.scale_factor)))}
+                               for circle in grid]
             
-            center_id = self.canvas.create_oval(
-                canvas_x - 3, canvas_y - 3,
-                canvas_x + 3, canvas_y + 3,
-                fill="red", outline="red"
-            )
+            fills = [""] * len(display_circles)
+            if self.show_color_preview and display_circles and self.preview_pixels is not None:
+                stats = self.color_analyzer.compute_quantized_stats(self.preview_pixels, display_circles)
+                fills = ["#%02x%02x%02x" % circle_stats['color'] if circle_stats['color'] else ""
+                         for circle_stats in stats]
             
-            self.point_ids.append((circle_id, center_id))
+            while len(self.grid_item_ids) < len(display_circles):
+                self.grid_item_ids.append(self.canvas.create_oval(0, 0, 0, 0, outline="cyan", width=1))
+            
+            for idx, item_id in enumerate(self.grid_item_ids):
+                if idx >= len(display_circles):
+                    self.canvas.itemconfigure(item_id, state="hidden")
+                    continue
+                circle = display_circles[idx]
+                x, y, r = circle['x'], circle['y'], circle['radius']
+                self.canvas.coords(item_id, x - r, y - r, x + r, y + r)
+                self.canvas.itemconfigure(item_id, state="normal", fill=fills[idx])
+        
+        # Corner handles stay above the grid
+        for circle_id, center_id in self.point_ids:
+            self.canvas.tag_raise(circle_id)
+            self.canvas.tag_raise(center_id)
     
     def update_status(self):
         """Update status display"""
@@ -256,29 +368,20 @@ class CornerSelector:
         
         # Remove last point
         self.corner_points.pop()
-        
-        # Remove last visual elements
-        if self.point_ids:
-            circle_id, center_id = self.point_ids.pop()
-            self.canvas.delete(circle_id)
-            self.canvas.delete(center_id)
+        self.update_visual_circles()
         
         self.update_status()
         self.update_points_list()
+        self.schedule_grid_redraw()
     
     def clear_all_points(self):
         """Clear all points"""
         self.corner_points = []
-        
-        # Clear visual elements
-        for circle_id, center_id in self.point_ids:
-            self.canvas.delete(circle_id)
-            self.canvas.delete(center_id)
-        
-        self.point_ids = []
+        self.update_visual_circles()
         
         self.update_status()
         self.update_points_list()
+        self.schedule_grid_redraw()
     
     def apply_corners(self):
         """Apply corner selection"""
@@ -306,5 +409,9 @@ class CornerSelector:
     def close_dialog(self):
         """Close corner selector dialog"""
         if self.selector_window:
+            if self.redraw_job is not None:
+                self.selector_window.after_cancel(self.redraw_job)
+                self.redraw_job = None
             self.selector_window.destroy()
-            self.selector_window = None
\ No newline at end of file
+            self.selector_window = None
+            self.canvas = None
\ No newline at end of file
@@ -226,4 +226,8 @@ class CropTool:
         """Close crop dialog"""
         if self.crop_window:
             self.crop_window.destroy()
-            self.crop_window = None
\ No newline at end of file
+            self.crop_window = None
+        
+        # Release the full size image and its display copy
+        self.image = None
+        self.photo = None
\ No newline at end of file
@@ -19,13 +19,25 @@ class ParameterPanel:
         self.on_previous_row = None
         self.on_finish_all_rows = None
         self.on_single_row_results = None
+        self.on_export_timings = None
+        self.on_save_profile = None
+        self.on_save_session = None
+        self.on_load_session = None
+        self.on_tolerance_changed = None
+        self.on_auto_tolerance = None
+        self.on_analyze_all_rows = None
+        self.on_auto_crop = None
         
         # Parameters
         self.grid_spacing = 30
         self.color_tolerance = 40
+        self.min_tolerance = 20
+        self.max_tolerance = 80
+        self.tolerance_step = 5
         self.num_tubes = 5
         self.balls_per_tube = 4
         self.num_rows = 1
+        self.fast_mode = False
         
         self.setup_panel()
     
@@ -96,11 +108,41 @@ class ParameterPanel:
                     font=ctk.CTkFont(size=13)).grid(row=0, column=0, padx=10, pady=10, sticky="w")
         
         self.rows_var = ctk.IntVar(value=self.num_rows)
-        rows_spinbox = ctk.CTkOptionMenu(rows_frame, values=["1", "2", "3", "4", "5"],
-                                       command=self.on_rows_change_menu,
-                                       variable=self.rows_var)
-        rows_spinbox.grid(row=0, column=1, padx=10, pady=10, sticky="e")
-        rows_spinbox.set(str(self.num_rows))
+        self.rows_menu = ctk.CTkOptionMenu(rows_frame, values=["1", "2", "3", "4", "5"],
+                                         command=self.on_rows_change_menu,
+                                         variable=self.rows_var)
+        self.rows_menu.grid(row=0, column=1, padx=10, pady=10, sticky="e")
+        self.rows_menu.set(str(self.num_rows))
+        
+        # Downsampled analysis for very large screenshots
+        self.fast_mode_var = ctk.BooleanVar(value=self.fast_mode)
+        fast_mode_check = ctk.CTkCheckBox(frame, text="⚡ Mode rapide (grandes images)",
+                                        variable=self.fast_mode_var,
+                                        command=self.on_fast_mode_change,
+                                        font=ctk.CTkFont(size=12))
+        fast_mode_check.grid(row=3, column=0, pady=(0, 10), padx=15, sticky="w")
+        
+        # Calibration profile for the current resolution
+        self.save_profile_button = ctk.CTkButton(frame, text="💾 Sauver profil de calibration",
+                                               command=self.request_save_profile,
+                                               font=ctk.CTkFont(size=12, weight="bold"),
+                                               height=28)
+        self.save_profile_button.grid(row=4, column=0, pady=(0, 10), padx=15, sticky="ew")
+        
+        # Session save/restore
+        session_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        session_frame.grid(row=5, column=0, sticky="ew", padx=15, pady=(0, 15))
+        session_frame.grid_columnconfigure(0, weight=1)
+        session_frame.grid_columnconfigure(1, weight=1)
+        
+        ctk.CTkButton(session_frame, text="💾 Sauver session",
+                     command=self.request_save_session,
+                     font=ctk.CTkFont(size=12, weight="bold"),
+                     height=28).grid(row=0, column=0, padx=(0, 5), sticky="ew")
+        ctk.CTkButton(session_frame, text="📂 Ouvrir session",
+                     command=self.request_load_session,
+                     font=ctk.CTkFont(size=12, weight="bold"),
+                     height=28).grid(row=0, column=1, padx=(5, 0), sticky="ew")
         
         # Start button
         self.start_button = ctk.CTkButton(frame, text="🚀 Démarrer Configuration", 
@@ -158,6 +200,13 @@ class ParameterPanel:
                                                  fg_color=("green", "darkgreen"))
         self.single_results_button.grid(row=0, column=2, padx=5, pady=10, sticky="ew")
         self.single_results_button.grid_remove()  # Hidden initially
+        
+        # Analyze every calibrated row at once
+        self.analyze_all_button = ctk.CTkButton(self.nav_frame, text="⚡ Analyser toutes les rangées",
+                                              command=self.request_analyze_all_rows,
+                                              font=ctk.CTkFont(size=12, weight="bold"),
+                                              height=28)
+        self.analyze_all_button.grid(row=2, column=0, columnspan=3, padx=20, pady=(0, 15), sticky="ew")
     
     def setup_crop_section(self):
         """Setup modern crop section"""
@@ -176,7 +225,15 @@ class ParameterPanel:
                                        font=ctk.CTkFont(size=13, weight="bold"),
                                        height=32,
                                        state="disabled")
-        self.crop_button.grid(row=1, column=0, pady=(5, 15), padx=15, sticky="ew")
+        self.crop_button.grid(row=1, column=0, pady=(5, 5), padx=15, sticky="ew")
+        
+        # Automatic row detection (the manual crop still overrides it)
+        self.auto_crop_button = ctk.CTkButton(frame, text="🪄 Recadrage auto des rangées",
+                                            command=self.request_auto_crop,
+                                            font=ctk.CTkFont(size=12, weight="bold"),
+                                            height=28,
+                                            state="disabled")
+        self.auto_crop_button.grid(row=2, column=0, pady=(0, 15), padx=15, sticky="ew")
     
     def setup_corner_section(self):
         """Setup modern corner section"""
@@ -280,10 +337,11 @@ class ParameterPanel:
                     font=ctk.CTkFont(size=12)).grid(row=1, column=0, pady=(5, 0))
         
         self.tolerance_var = ctk.IntVar(value=self.color_tolerance)
-        tolerance_slider = ctk.CTkSlider(frame, from_=20, to=80, number_of_steps=12,
-                                       variable=self.tolerance_var, command=self.on_tolerance_change)
-        tolerance_slider.grid(row=2, column=0, sticky="ew", padx=15, pady=5)
-        tolerance_slider.set(self.color_tolerance)
+        self.tolerance_slider = ctk.CTkSlider(frame, from_=self.min_tolerance, to=self.max_tolerance,
+                                            number_of_steps=(self.max_tolerance - self.min_tolerance) // self.tolerance_step,
+                                            variable=self.tolerance_var, command=self.on_tolerance_change)
+        self.tolerance_slider.grid(row=2, column=0, sticky="ew", padx=15, pady=5)
+        self.tolerance_slider.set(self.color_tolerance)
         
         # Tolerance value display
         self.tolerance_label = ctk.CTkLabel(frame, text=f"Valeur: {self.color_tolerance}", 
@@ -296,7 +354,14 @@ class ParameterPanel:
                                           height=32,
                                           fg_color=("purple", "darkmagenta"),
                                           state="disabled")
-        self.analyze_button.grid(row=4, column=0, pady=(5, 15), padx=15, sticky="ew")
+        self.analyze_button.grid(row=4, column=0, pady=(5, 5), padx=15, sticky="ew")
+        
+        # Search the tolerance giving full tubes (after an analysis)
+        self.auto_tolerance_button = ctk.CTkButton(frame, text="🎯 Tolérance auto",
+                                                 command=self.request_auto_tolerance,
+                                                 font=ctk.CTkFont(size=12, weight="bold"),
+                                                 height=28)
+        self.auto_tolerance_button.grid(row=5, column=0, pady=(0, 15), padx=15, sticky="ew")
     
     def setup_status_section(self):
         """Setup modern status section"""
@@ -316,13 +381,20 @@ class ParameterPanel:
                                         font=ctk.CTkFont(size=10))
         self.status_text.grid(row=1, column=0, sticky="ew", padx=15, pady=5)
         
+        # Export timings button
+        export_btn = ctk.CTkButton(frame, text="⏱️ Exporter mesures", 
+                                 command=self.request_export_timings,
+                                 font=ctk.CTkFont(size=12, weight="bold"),
+                                 height=28)
+        export_btn.grid(row=2, column=0, pady=(15, 0), padx=15, sticky="ew")
+        
         # Clear button
         clear_btn = ctk.CTkButton(frame, text="🗑️ Effacer tout", 
                                 command=self.clear_all,
                                 font=ctk.CTkFont(size=12, weight="bold"),
                                 fg_color=("red", "darkred"),
                                 height=28)
-        clear_btn.grid(row=2, column=0, pady=15, padx=15, sticky="ew")
+        clear_btn.grid(row=3, column=0, pady=15, padx=15, sticky="ew")
     
     def set_callbacks(self, crop_callback, corners_callback, grid_callback, analyze_callback, 
                      start_config_callback=None, next_row_callback=None, 
@@ -341,6 +413,7 @@ class ParameterPanel:
     def enable_crop_button(self, enabled=True):
         state = "normal" if enabled else "disabled"
         self.crop_button.configure(state=state)
+        self.auto_crop_button.configure(state=state)
     
     def enable_corners_button(self, enabled=True):
         state = "normal" if enabled else "disabled"
@@ -375,6 +448,10 @@ class ParameterPanel:
         self.status_text.delete("0.0", "end")
         self.status_text.insert("0.0", current_text + message + "\n")
     
+    def add_timing_message(self, name, duration_ms):
+        """Show a stage timing in the status panel"""
+        self.add_status_message(f"⏱️ {name}: {duration_ms:.1f} ms")
+    
     def clear_status(self):
         self.status_text.delete("0.0", "end")
     
@@ -402,6 +479,9 @@ class ParameterPanel:
         # Update tolerance display
         if hasattr(self, 'tolerance_label'):
             self.tolerance_label.configure(text=f"Valeur: {self.color_tolerance}")
+        # Live regrouping of the analyzed balls
+        if self.on_tolerance_changed:
+            self.on_tolerance_changed(self.color_tolerance)
     
     def on_tubes_change_menu(self, value):
         """Handle tubes change from option menu"""
@@ -433,6 +513,73 @@ class ParameterPanel:
         if hasattr(self, '_on_tube_params_changed') and self._on_tube_params_changed:
             self._on_tube_params_changed()
     
+    def set_export_timings_callback(self, callback):
+        """Set callback for timings export"""
+        self.on_export_timings = callback
+    
+    def request_export_timings(self):
+        if self.on_export_timings:
+            self.on_export_timings()
+    
+    def set_save_profile_callback(self, callback):
+        """Set callback for calibration profile save"""
+        self.on_save_profile = callback
+    
+    def request_save_profile(self):
+        if self.on_save_profile:
+            self.on_save_profile()
+    
+    def set_auto_tolerance_callback(self, callback):
+        """Set callback for automatic tolerance search"""
+        self.on_auto_tolerance = callback
+    
+    def request_auto_tolerance(self):
+        if self.on_auto_tolerance:
+            self.on_auto_tolerance()
+    
+    def set_auto_crop_callback(self, callback):
+        """Set callback for automatic row crop"""
+        self.on_auto_crop = callback
+    
+    def request_auto_crop(self):
+        if self.on_auto_crop:
+            self.on_auto_crop()
+    
+    def set_analyze_all_rows_callback(self, callback):
+        """Set callback for the all rows analysis"""
+        self.on_analyze_all_rows = callback
+    
+    def request_analyze_all_rows(self):
+        if self.on_analyze_all_rows:
+            self.on_analyze_all_rows()
+    
+    def enable_analyze_all_button(self, enabled=True):
+        state = "normal" if enabled else "disabled"
+        self.analyze_all_button.configure(state=state)
+    
+    def set_color_tolerance(self, tolerance):
+        """Show a tolerance chosen by the application (no change callback)"""
+        self.color_tolerance = int(tolerance)
+        self.tolerance_slider.set(self.color_tolerance)
+        self.tolerance_label.configure(text=f"Valeur: {self.color_tolerance}")
+    
+    def set_tolerance_change_callback(self, callback):
+        """Set callback called while the tolerance slider moves"""
+        self.on_tolerance_changed = callback
+    
+    def set_session_callbacks(self, save_callback, load_callback):
+        """Set callbacks for session save and restore"""
+        self.on_save_session = save_callback
+        self.on_load_session = load_callback
+    
+    def request_save_session(self):
+        if self.on_save_session:
+            self.on_save_session()
+    
+    def request_load_session(self):
+        if self.on_load_session:
+            self.on_load_session()
+    
     def set_tube_params_change_callback(self, callback):
         """Set callback for tube parameter changes"""
         self._on_tube_params_changed = callback
@@ -456,12 +603,28 @@ class ParameterPanel:
     def get_color_tolerance(self):
         return self.color_tolerance
     
+    def get_tolerance_range(self):
+        """Get (min, max, step) of the tolerance slider"""
+        return self.min_tolerance, self.max_tolerance, self.tolerance_step
+    
     def get_tube_parameters(self):
         return self.num_tubes, self.balls_per_tube
     
     def get_num_rows(self):
         return self.num_rows
     
+    def set_num_rows(self, num_rows):
+        """Set number of rows (e.g. from a calibration profile)"""
+        self.num_rows = num_rows
+        self.rows_var.set(num_rows)
+        self.rows_menu.set(str(num_rows))
+    
+    def on_fast_mode_change(self):
+        self.fast_mode = self.fast_mode_var.get()
+    
+    def get_fast_mode(self):
+        return self.fast_mode
+    
     def on_rows_change(self):
         self.num_rows = self.rows_var.get()
         # Always enable start button when rows are configured
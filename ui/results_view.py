@@ -0,0 +1,180 @@
+"""
+Virtualized results list and tube matrix thumbnail - CustomTkinter
+"""
+import customtkinter as ctk
+import numpy as np
+from PIL import Image
+
+def color_to_hex(rgb):
+    """Convert an RGB tuple to a Tk color string"""
+    return f"#{int(rgb[0]):02x}{int(rgb[1]):02x}{int(rgb[2]):02x}"
+
+def get_theme_colors():
+    """Get (background, text, secondary text) canvas colors for the appearance mode"""
+    if ctk.get_appearance_mode() == "Light":
+        return "#ebebeb", "#1a1a1a", "#666666"
+    return "#2b2b2b", "#f0f0f0", "#9a9a9a"
+
+class VirtualResultsList:
+    """Scrollable list drawing only its visible rows on one canvas"""
+
+    def __init__(self, parent, row_height=30, height=300, swatch_size=20):
+        self.row_height = row_height
+        self.swatch_size = swatch_size
+        self.items = []
+        self.slots = []
+        self.first_visible = -1
+
+        self.background, self.text_color, self.secondary_color = get_theme_colors()
+
+        self.frame = ctk.CTkFrame(parent)
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+
+        self.canvas = ctk.CTkCanvas(self.frame, height=height, bg=self.background,
+                                    highlightthickness=0)
+        self.scrollbar = ctk.CTkScrollbar(self.frame, orientation="vertical", command=self.on_scroll)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw(force=True))
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_units(-1))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_units(1))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def set_items(self, items):
+        """Set list items
+
+        Each item is a dict with 'text' and optionally 'color' (RGB swatch),
+        'detail' (secondary text), 'header' (bold title row) and 'indent'.
+        """
+        self.items = list(items)
+        self.canvas.configure(scrollregion=(0, 0, 1, max(1, len(self.items) * self.row_height)))
+        self.canvas.yview_moveto(0)
+        self.redraw(force=True)
+
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def scroll_units(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self.redraw()
+
+    def on_mouse_wheel(self, event):
+        self.scroll_units(-1 if event.delta > 0 else 1)
+
+    def ensure_slots(self, count):
+        """Create canvas items for count visible rows (reused while scrolling)"""
+        font = ("Arial", 11)
+        while len(self.slots) < count:
+            self.slots.append({
+                'swatch': self.canvas.create_rectangle(0, 0, 0, 0, outline="black", state="hidden"),
+                'text': self.canvas.create_text(0, 0, anchor="w", fill=self.text_color,
+                                                font=font, state="hidden"),
+                'detail': self.canvas.create_text(0, 0, anchor="e", fill=self.secondary_color,
+                                                  font=("Arial", 10), state="hidden")
+            })
+
+    def redraw(self, force=False):
+        """Update the pooled canvas items for the rows in view"""
+        view_height = max(self.canvas.winfo_height(), self.row_height)
+        width = max(self.canvas.winfo_width(), 100)
+        top = self.canvas.canvasy(0)
+
+        first = int(top // self.row_height)
+        if first == self.first_visible and not force:
+            return
+        self.first_visible = first
+
+        visible = view_height // self.row_height + 2
+        self.ensure_slots(visible)
+
+        for slot_idx, slot in enumerate(self.slots):
+            item_idx = first + slot_idx
+            if slot_idx >= visible or item_idx >= len(self.items):
+                for item_id in slot.values():
+                    self.canvas.itemconfigure(item_id, state="hidden")
+                continue
+
+            item = self.items[item_idx]
+            y = item_idx * self.row_height + self.row_height / 2
+            x = 10 + item.get('indent', 0) * 20
+
+            if item.get('color') is not None:
+                half = self.swatch_size / 2
+                self.canvas.coords(slot['swatch'], x, y - half, x + self.swatch_size, y + half)
+                self.canvas.itemconfigure(slot['swatch'], fill=color_to_hex(item['color']), state="normal")
+                x += self.swatch_size + 10
+            else:
+                self.canvas.itemconfigure(slot['swatch'], state="hidden")
+
+            font = ("Arial", 12, "bold") if item.get('header') else ("Arial", 11)
+            self.canvas.coords(slot['text'], x, y)
+            self.canvas.itemconfigure(slot['text'], text=item['text'], font=font, state="normal")
+
+            self.canvas.coords(slot['detail'], width - 10, y)
+            self.canvas.itemconfigure(slot['detail'], text=item.get('detail', ''), state="normal")
+
+def render_matrix_thumbnail(color_matrices, cell_size=8, gap=1, row_gap=6, background=(40, 40, 40)):
+    """Draw color matrices (one per row, matrix[tube][ball]) as a single image
+
+    Tubes are columns with the top slot first; each row of the board is
+    drawn below the previous one. Empty slots keep the background color.
+    """
+    color_matrices = [matrix for matrix in color_matrices if matrix]
+    if not color_matrices:
+        return None
+
+    step = cell_size + gap
+    width = max(len(matrix) for matrix in color_matrices) * step + gap
+    heights = [max(len(tube) for tube in matrix) * step + gap for matrix in color_matrices]
+    height = sum(heights) + row_gap * (len(color_matrices) - 1)
+
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[:] = background
+
+    top = 0
+    for matrix, matrix_height in zip(color_matrices, heights):
+        for tube_idx, tube in enumerate(matrix):
+            x = gap + tube_idx * step
+            for ball_idx, color in enumerate(tube):
+                if color is None:
+                    continue
+                y = top + gap + ball_idx * step
+                pixels[y:y + cell_size, x:x + cell_size] = color[:3]
+        top += matrix_height + row_gap
+
+    return Image.fromarray(pixels)
+
+class TubeMatrixThumbnail:
+    """Compact image of the board color matrices"""
+
+    def __init__(self, parent, color_matrices, cell_size=8, max_width=760):
+        self.label = None
+        self.image = None
+
+        thumbnail = render_matrix_thumbnail(color_matrices, cell_size)
+        if thumbnail is None:
+            return
+
+        # Shrink huge boards to the window width
+        if thumbnail.size[0] > max_width:
+            scale = max_width / thumbnail.size[0]
+            thumbnail = thumbnail.resize((max_width, max(1, int(thumbnail.size[1] * scale))),
+                                         Image.Resampling.NEAREST)
+
+        self.image = ctk.CTkImage(light_image=thumbnail, dark_image=thumbnail, size=thumbnail.size)
+        self.label = ctk.CTkLabel(parent, image=self.image, text="")
+
+    def pack(self, **kwargs):
+        if self.label:
+            self.label.pack(**kwargs)